@@ -1,7 +1,7 @@
 """
 This is a simple library that allows you to read, write and create files within your own folder inside the user folder (`C:/User/USER/.python/PACKAGE_ID`)
 """
-from typing import Self
+from typing import Self, BinaryIO
 from io import TextIOWrapper
 import os
 import requests
@@ -16,16 +16,43 @@ import threading
 import atexit
 import json
 import tempfile
+import weakref
+import contextlib
+import copy
+import pickle
+import sqlite3
+import sys
+import time
+import heapq
+import mmap
+import asyncio
+import functools
+import concurrent.futures
+import collections.abc
+import shutil
+import gzip
+import bz2
+import lzma
+import zlib
 
 __version__ = '1.2.0'
 __temp__ = []
-__root__ = {'sessionStorage': [], 'cache': []}
-__all__ = ['UnsupportedArchiveError', 'CacheError',
+__executor__ = None
+__unset__ = object()
+__root__ = {'sessionStorage': [], 'cache': [], 'storage': weakref.WeakSet()}
+__all__ = ['UnsupportedArchiveError', 'CacheError', 'DownloadError',
            'TrackEvent',
+           'CacheReport',
+           'DownloadReport',
+           'Downloads',
            'User',
+           'Serializer',
+           'register_serializer',
+           'get_serializer',
            'Storage',
            'localStorage',
            'sessionStorage',
+           'SQLiteStorage',
            'Config',
            'Cache',
            'getUser',
@@ -33,12 +60,109 @@ __all__ = ['UnsupportedArchiveError', 'CacheError',
            'getSessionStorage',
            'getCache',
            'getLocalStorage',
+           'set_executor',
            'ctkdialog',
            'dialog'
 ]
 
 class UnsupportedArchiveError(Exception): pass
 class CacheError(Exception): pass
+class DownloadError(Exception): pass
+
+class CacheReport():
+    def __init__(self, files: int, bytes: int, seconds: float):
+        """
+        How much was copied by a Cache operation and how fast
+
+        :param files: The number of files that were copied
+        :type files: int
+        :param bytes: The number of bytes that were copied
+        :type bytes: int
+        :param seconds: How long it took
+        :type seconds: float
+        """
+        self.files = files
+        self.bytes = bytes
+        self.seconds = seconds
+        self.files_per_second = files / seconds if seconds else 0
+        self.bytes_per_second = bytes / seconds if seconds else 0
+
+    def __str__(self):
+        return f'CacheReport(files={self.files}, bytes={self.bytes}, files_per_second={self.files_per_second:.1f}, bytes_per_second={self.bytes_per_second:.1f})'
+
+class DownloadReport(CacheReport):
+    """How many files were downloaded and how fast"""
+    def __str__(self):
+        return f'DownloadReport(files={self.files}, bytes={self.bytes}, files_per_second={self.files_per_second:.1f}, bytes_per_second={self.bytes_per_second:.1f})'
+
+class Downloads():
+    def __init__(self, urls: list[str], futures: list[concurrent.futures.Future], cancel: threading.Event):
+        """
+        The downloads started by `User.download_many`
+
+        :param urls: The URL of every download
+        :type urls: list[str]
+        :param futures: The future of every download. The result is the response
+        :type futures: list[concurrent.futures.Future]
+        :param cancel: Stops the running downloads when set
+        :type cancel: threading.Event
+        """
+        self.urls = urls
+        self.futures = futures
+        self.bytes = 0
+        self.start = time.perf_counter()
+        self.end = None
+        self._cancel = cancel
+        self._lock = threading.Lock()
+
+    def _received(self, size: int):
+        with self._lock: self.bytes += size
+
+    def cancel(self) -> Self:
+        """
+        Cancels the downloads that have not started yet and stops the running downloads after their current chunk. Their '.part' files are kept so they can be resumed
+
+        :rtype: Downloads
+        """
+        self._cancel.set()
+        for future in self.futures: future.cancel()
+        return self
+
+    def wait(self, timeout: float = None) -> DownloadReport:
+        """
+        Waits for every download to finish
+
+        :param timeout: The most seconds to wait, defaults to None
+        :type timeout: float, optional
+        :return: How many files were downloaded and how fast
+        :rtype: DownloadReport
+        """
+        concurrent.futures.wait(self.futures, timeout)
+        return self.report
+
+    def results(self) -> list:
+        """
+        Waits for every download to finish and returns the response, or the error that stopped it, in the same order as the URLs
+
+        :rtype: list[requests.Response | Exception]
+        """
+        results = []
+        for future in self.futures:
+            try: results.append(future.result())
+            except (Exception, concurrent.futures.CancelledError) as err: results.append(err)
+        return results
+
+    @property
+    def done(self) -> bool:
+        """True when every download has finished, failed or been cancelled"""
+        return all(future.done() for future in self.futures)
+
+    @property
+    def report(self) -> DownloadReport:
+        """How many files have been downloaded so far and how fast"""
+        files = sum(1 for future in self.futures if future.done() and future.cancelled() == False and future.exception() is None)
+        end = self.end if self.end is not None else time.perf_counter()
+        return DownloadReport(files, self.bytes, end - self.start)
 
 class TrackEvent():
     def __init__(self, member: zipfile.ZipInfo, count: int, total: int):
@@ -49,15 +173,17 @@ class TrackEvent():
         :type member: zipfile.ZipInfo
         :param count: The current member of total
         :type count: int
-        :param total:  The total number of members
+        :param total:  The total number of members, or None when it is not known
         :type total: int
         """
         self.member = member
         self.count = count
         self.total = total
-        self.percentage = count * 100 / total
+        self.percentage = count * 100 / total if total else 0
 
 class User():
+    CHUNK_SIZE = 64 * 1024
+
     def __init__(self, id:str=None, setupcommand=None, path:str=None):
         """
         Will create the file path inside the Users folder. Your id should be a unique string just for your script.
@@ -101,48 +227,231 @@ class User():
     def __str__(self):
         return f'User(id={self.id})'
 
-    def _download(self, package, filename, trackcommand):
-        r = requests.get(package, allow_redirects=True)
+    @property
+    def session(self) -> requests.Session:
+        """The session that downloads use, so connections to the same host are kept open and reused"""
+        if getattr(self, '_session', None) is None:
+            self._session = requests.Session()
+            self._mount(10)
+        return self._session
+
+    def _mount(self, size: int):
+        """Internal Function. Replaces the connection pools of the session with pools of this size"""
+        adapter = requests.adapters.HTTPAdapter(pool_connections=size, pool_maxsize=size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._pool_size = size
+
+    def pool_size(self, size: int) -> Self:
+        """
+        Makes sure the session keeps at least this many connections open to each host
+
+        :param size: The number of connections
+        :type size: int
+        :rtype: User
+        """
+        self.session # Create the session first
+        if size > self._pool_size: self._mount(size)
+        return self
+
+    def _download(self, package, filename, trackcommand, resume=True, cancel=None, received=None, segments=1, checksum=None, cache=None):
+        """Internal Function. Streams the download to a .part file which is moved into place once it is complete"""
         if filename == None:
             filename = os.path.basename(package)
-        if r.status_code == 200:
-            open(self.join(filename), 'wb').write(r.content)
+        dst = self.join(filename)
+        part = dst + '.part'
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        entry = cache.objects.get(cache.key(dst)) if cache is not None else None
+        if entry is not None and entry.get('url') != package: entry = None # Cached from somewhere else
+        if segments > 1 and entry is None and hasattr(os, 'pwrite') and (resume == False or os.path.exists(part) == False):
+            r = self._download_segments(package, filename, part, trackcommand, cancel, received, segments)
+            if r is not None:
+                self._finish(package, part, dst, checksum, cache, r)
+                return r
+        offset = os.path.getsize(part) if resume and os.path.exists(part) else 0
+        validator = self._part_validator(part, package) if offset else None
+        if validator is None: offset = 0 # Can not tell if the .part file is from the same version of the file
+        headers = {'Range': f'bytes={offset}-', 'If-Range': validator} if offset else {}
+        if entry is not None and offset == 0: # Only download the file when it has changed
+            if entry.get('etag') is not None: headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified') is not None: headers['If-Modified-Since'] = entry['last_modified']
+        with self.session.get(package, allow_redirects=True, stream=True, headers=headers) as r:
+            if r.status_code == 304 and entry is not None:
+                try: cache._restore(dst)
+                except CacheError: # The cached object is gone, download it again
+                    cache.remove_file(dst)
+                    return self._download(package, filename, trackcommand, resume, cancel, received, segments, checksum, cache)
+                return r
+            if r.status_code == 416 and r.headers.get('Content-Range') == f'bytes */{offset}': # The .part file is already complete
+                self._finish(package, part, dst, checksum, cache, r)
+                return r
+            if r.status_code not in (200, 206): return r
+            if r.status_code == 206 and r.headers.get('Content-Range', '').startswith(f'bytes {offset}-') == False: # Not the rest of the .part file, start again
+                r.close()
+                return self._download(package, filename, trackcommand, False, cancel, received, segments, checksum, cache)
+            if r.status_code == 200: offset = 0 # The server sent the whole file, the .part file was outdated
+            if offset == 0: self._save_validator(part, package, r)
+            length = r.headers.get('Content-Length')
+            total = offset + int(length) if length is not None and r.headers.get('Content-Encoding') is None else None
+            count = offset
+            with open(part, 'ab' if offset else 'wb') as w:
+                for chunk in r.iter_content(self.CHUNK_SIZE):
+                    w.write(chunk)
+                    count += len(chunk)
+                    if received != None: received(len(chunk))
+                    if trackcommand != None: trackcommand(TrackEvent(filename, count, total))
+                    if cancel != None and cancel.is_set(): raise DownloadError(f"Download of '{package}' was cancelled")
+            if total is not None and count != total: raise DownloadError(f"Download of '{package}' is incomplete: {count} of {total} bytes")
+            self._finish(package, part, dst, checksum, cache, r)
+            return r
+
+    def _download_segments(self, package, filename, part, trackcommand, cancel, received, segments):
+        """Internal Function. Downloads byte ranges of the file at the same time into a preallocated .part file. Returns None when the server does not support ranges"""
+        identity = {'Accept-Encoding': 'identity'}
+        with self.session.get(package, allow_redirects=True, stream=True, headers=dict(identity, Range='bytes=0-0')) as r:
+            match = re.match(r'bytes 0-0/(\d+)$', r.headers.get('Content-Range', ''))
+            if r.status_code != 206 or match is None: return None
+            url = r.url # Skip the redirects
+        total = int(match.group(1))
+        if total < segments * self.CHUNK_SIZE: return None # Too small to be worth it
+        size = -(-total // segments)
+        ranges = [(start, min(start + size, total) - 1) for start in range(0, total, size)]
+        lock = threading.Lock()
+        stop = threading.Event()
+        count = [0]
+        def fetch(fd, start, end):
+            headers = dict(identity, Range=f'bytes={start}-{end}')
+            with self.session.get(url, stream=True, headers=headers) as res:
+                if res.status_code != 206 or res.headers.get('Content-Range', '').startswith(f'bytes {start}-{end}/') == False:
+                    raise DownloadError(f"Download of '{package}' did not return the range {start}-{end}")
+                offset = start
+                for chunk in res.iter_content(self.CHUNK_SIZE):
+                    if offset + len(chunk) > end + 1: raise DownloadError(f"Download of '{package}' returned too many bytes for the range {start}-{end}")
+                    os.pwrite(fd, chunk, offset)
+                    offset += len(chunk)
+                    with lock:
+                        count[0] += len(chunk)
+                        event = TrackEvent(filename, count[0], total)
+                    if received != None: received(len(chunk))
+                    if trackcommand != None: trackcommand(event)
+                    if stop.is_set() or (cancel != None and cancel.is_set()): raise DownloadError(f"Download of '{package}' was cancelled")
+                if offset != end + 1: raise DownloadError(f"Download of '{package}' is incomplete: {offset - start} of {end + 1 - start} bytes of the range {start}-{end}")
+        fd = os.open(part, os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            os.ftruncate(fd, total) # Preallocate
+            with concurrent.futures.ThreadPoolExecutor(max_workers=segments, thread_name_prefix='Download') as pool:
+                futures = [pool.submit(fetch, fd, start, end) for start, end in ranges]
+                try:
+                    for future in concurrent.futures.as_completed(futures): future.result()
+                except BaseException:
+                    stop.set() # Stop the other segments before the pool waits for them
+                    for future in futures: future.cancel()
+                    raise
+        except BaseException:
+            os.close(fd)
+            os.remove(part) # The ranges that were not downloaded are empty, it can not be resumed
+            raise
+        os.close(fd)
+        if os.path.getsize(part) != total: raise DownloadError(f"Download of '{package}' is incomplete: {os.path.getsize(part)} of {total} bytes")
         return r
 
-    def _unarchive(self, src, dst, members, format, deletesrc, trackcommand):
+    @staticmethod
+    def _part_validator(part, package):
+        """Internal Function. Returns the ETag or Last-Modified of the file the .part file was downloaded from, or None when it is not known"""
+        try:
+            with open(part + '.json', 'r') as r: meta = json.load(r)
+        except (OSError, ValueError): return None
+        return meta.get('validator') if meta.get('url') == package else None
+
+    @staticmethod
+    def _save_validator(part, package, r):
+        """Internal Function. Saves the ETag or Last-Modified next to the .part file so it is only resumed while the file has not changed"""
+        validator = r.headers.get('ETag')
+        if validator is None or validator.startswith('W/'): validator = r.headers.get('Last-Modified') # Weak ETags can not be used with If-Range
+        with open(part + '.json', 'w') as w: json.dump({'url': package, 'validator': validator}, w)
+
+    def _finish(self, package, part, dst, checksum, cache=None, r=None):
+        """Internal Function. Checks the checksum of the complete .part file, moves it into place and adds it to the cache"""
+        if checksum is not None:
+            algorithm, _, digest = checksum.rpartition(':')
+            with open(part, 'rb') as rb: found = hashlib.file_digest(rb, algorithm or 'sha256').hexdigest()
+            if found != digest.lower():
+                os.remove(part)
+                raise DownloadError(f"Download of '{package}' does not match its checksum: {found}")
+        os.replace(part, dst)
+        try: os.remove(part + '.json')
+        except FileNotFoundError: pass
+        if cache is not None: cache._add_download(package, dst, r.headers.get('ETag'), r.headers.get('Last-Modified'))
+
+    def _unarchive(self, src, dst, members, format, deletesrc, trackcommand, workers=1):
         """Internal Function"""
         src = self.join(src)
         if dst == None: dst = self.path
         else: dst = self.join(dst)
         # Get format
         if format is None:  # Auto detect format
-            if src.endswith('.zip'):
+            name = src.casefold()
+            if name.endswith('.zip'):
                 format = 'zip'
-            elif src.endswith('.gz'):
+            elif name.endswith(('.gz', '.tgz')):
                 format = 'gz'
+            elif name.endswith(('.xz', '.txz')):
+                format = 'xz'
+            elif name.endswith(('.bz2', '.tbz', '.tbz2')):
+                format = 'bz2'
+            elif name.endswith('.tar'):
+                format = 'tar'
+            else:
+                format = ''
         else:
             format = format.upper()
         match format.casefold():
             case 'zip':
                 with zipfile.ZipFile(src, 'r') as file:
                     if members is None:
-                        MEMBERS = file.namelist()
+                        MEMBERS = file.infolist()
                     else:
-                        MEMBERS = members
+                        MEMBERS = [member if isinstance(member, zipfile.ZipInfo) else file.getinfo(member) for member in members]
                     total = len(MEMBERS)
                     count = 1
-                    for member in MEMBERS:
-                        file.extract(member, dst)
-                        event = TrackEvent(member, count, total)
-                        if trackcommand != None:
-                            trackcommand(event)
-                        count += 1
+                    if workers is None or workers > 1:
+                        # Create the directories up front, then decompress the members on a thread pool. Every thread reads with its own handle
+                        folders = set()
+                        for member in MEMBERS:
+                            parts = [part for part in member.filename.split('/') if part not in ('', '.', '..')]
+                            if member.is_dir(): folders.add(os.path.join(dst, *parts))
+                            elif len(parts) > 1: folders.add(os.path.join(dst, *parts[:-1]))
+                        for folder in folders: os.makedirs(folder, exist_ok=True)
+                        local = threading.local()
+                        handles = []
+                        def extract(member):
+                            if getattr(local, 'file', None) is None:
+                                local.file = zipfile.ZipFile(src, 'r')
+                                handles.append(local.file)
+                            return local.file.extract(member, dst)
+                        try:
+                            with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='Unarchive') as pool:
+                                futures = {pool.submit(extract, member): member for member in MEMBERS}
+                                for future in concurrent.futures.as_completed(futures):
+                                    future.result()
+                                    if trackcommand != None:
+                                        trackcommand(TrackEvent(futures[future].filename, count, total))
+                                    count += 1
+                        finally:
+                            for handle in handles: handle.close()
+                    else:
+                        for member in MEMBERS:
+                            file.extract(member, dst)
+                            event = TrackEvent(member.filename, count, total)
+                            if trackcommand != None:
+                                trackcommand(event)
+                            count += 1
                 if deletesrc:
                     os.remove(src)
                 return True
-            
-            case 'gz':
-                with tarfile.open(src) as file:
+
+            case 'gz' | 'xz' | 'bz2' | 'tar':
+                with tarfile.open(src, 'r:*') as file: # Members of a tar can only be read in order
                     if members is None:
                         MEMBERS = file.getmembers()
                     else:
@@ -155,12 +464,11 @@ class User():
                             trackcommand(event)
                         file.extract(member, dst)
                         count += 1
-                    file.close()
                 if deletesrc:
                     os.remove(src)
                 return True
             case _:
-                raise UnsupportedArchiveError('Unsupported archive! Supported archive types: .zip, .gz')
+                raise UnsupportedArchiveError('Unsupported archive! Supported archive types: .zip, .tar, .tar.gz, .tgz, .tar.xz, .tar.bz2')
 
     def join(self, *paths: str) -> str:
         """
@@ -279,29 +587,72 @@ class User():
         except:
             return False
 
-    def download(self, package: str, filename: str = None, trackcommand=None, thread:bool=False) -> requests.Response:
+    def download(self, package: str, filename: str = None, trackcommand=None, thread:bool=False, resume:bool=True, segments:int=1, checksum:str=None, cache=None) -> requests.Response:
         """
-        Download file from the web. If request returns status code '404' it will not download the file
+        Download file from the web. If request returns status code '404' it will not download the file. The file is streamed to a '.part' file which is renamed once the download is complete
 
         :param package: The URL to the package to download
         :type package: str
         :param filename: The filename of the package, defaults to None
         :type filename: str, optional
-        :param trackcommand: The callback command for downloading the file, defaults to None
+        :param trackcommand: The callback command for every chunk that is downloaded. The count and total of the event are in bytes, defaults to None
         :type trackcommand: Function, optional
         :param thread: If true it will run in a new thread, defaults to False
         :type thread: bool, optional
+        :param resume: When true a '.part' file left by an interrupted download is continued with a Range request, defaults to True
+        :type resume: bool, optional
+        :param segments: The number of byte ranges that are downloaded at the same time. Only used when the server supports ranges and there is no '.part' file to resume, otherwise the file is downloaded as one stream, defaults to 1
+        :type segments: int, optional
+        :param checksum: The sha256 hex digest the file must have. Use 'algorithm:digest' for another algorithm, like 'md5:...', defaults to None
+        :type checksum: str, optional
+        :param cache: The cache that keeps the downloaded file with its ETag and Last-Modified. When it is cached the server is asked if it has changed, and a '304 Not Modified' response does not download or rewrite the file, defaults to None
+        :type cache: Cache, optional
         :return: Response from the download
         :rtype: requests.Response
         """
         if thread:
-            t = threading.Thread(target=self._download, args=[package, filename, trackcommand])
+            t = threading.Thread(target=self._download, args=[package, filename, trackcommand, resume], kwargs={'segments': segments, 'checksum': checksum, 'cache': cache})
             t.start()
-        else: self._download(package, filename, trackcommand)
+        else: return self._download(package, filename, trackcommand, resume, segments=segments, checksum=checksum, cache=cache)
 
-    def unarchive(self, src: str, dst: str = None, members: list = None, format: str = None, deletesrc: bool = True, trackcommand=None, thread:bool=False) -> bool:
+    def download_many(self, urls: list[str] | dict[str, str], max_workers: int = 8, trackcommand=None, resume: bool = True) -> Downloads:
         """
-        Unarchive a zip or gz file. It's recomended to call this method in a thread
+        Downloads many files at the same time on a thread pool. The downloads share one session, so connections are reused
+
+        :param urls: The URLs to download, or a dict of URLs and their filenames
+        :type urls: list[str] | dict[str, str]
+        :param max_workers: The most files that are downloaded at the same time, defaults to 8
+        :type max_workers: int, optional
+        :param trackcommand: The callback command for every file that has been downloaded, defaults to None
+        :type trackcommand: Function, optional
+        :param resume: When true '.part' files left by interrupted downloads are continued, defaults to True
+        :type resume: bool, optional
+        :return: The downloads. Use `.wait()` or `.results()` to wait for them, or `.cancel()` to stop them
+        :rtype: Downloads
+        """
+        if isinstance(urls, dict) == False: urls = {url: None for url in urls}
+        self.pool_size(max_workers)
+        cancel = threading.Event()
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='Download')
+        downloads = Downloads(list(urls), [], cancel)
+        count = [0]
+        lock = threading.Lock()
+        def done(url: str, future: concurrent.futures.Future):
+            with lock:
+                count[0] += 1
+                event = TrackEvent(url, count[0], len(urls))
+                if count[0] == len(urls): downloads.end = time.perf_counter()
+            if trackcommand != None and future.cancelled() == False: trackcommand(event)
+        for url, filename in urls.items():
+            downloads.futures.append(pool.submit(self._download, url, filename, None, resume, cancel, downloads._received))
+        for url, future in zip(urls, downloads.futures): future.add_done_callback(functools.partial(done, url))
+        if not urls: downloads.end = downloads.start
+        pool.shutdown(wait=False)
+        return downloads
+
+    def unarchive(self, src: str, dst: str = None, members: list = None, format: str = None, deletesrc: bool = True, trackcommand=None, thread:bool=False, workers:int=1) -> bool:
+        """
+        Unarchive a zip, tar, tar.gz, tar.xz or tar.bz2 file. It's recomended to call this method in a thread
 
         :param src: The path to the archive
         :type src: str
@@ -309,7 +660,7 @@ class User():
         :type dst: str, optional
         :param members: The members to unarchive. Will otherwise extract all members, defaults to None
         :type members: list, optional
-        :param format: The archive format. 'zip' or 'gz', defaults to None
+        :param format: The archive format. 'zip', 'tar', 'gz', 'xz' or 'bz2', defaults to None
         :type format: str, optional
         :param deletesrc: Delete the orgional source file after it is done unarchiving, defaults to True
         :type deletesrc: bool, optional
@@ -317,16 +668,18 @@ class User():
         :type trackcommand: _type_, optional
         :param thread: If true it will run in a new thread, defaults to False
         :type thread: bool, optional
+        :param workers: The number of threads that decompress the members of a zip file. None uses the default of the thread pool, defaults to 1
+        :type workers: int, optional
         :return: true - successfully unarchived package, false - failed to unarchive package
         :rtype: bool
         """
        
         
         if thread:
-            t = threading.Thread(target=self._unarchive, args=[src, dst, members, format, deletesrc, trackcommand])
+            t = threading.Thread(target=self._unarchive, args=[src, dst, members, format, deletesrc, trackcommand, workers])
             t.start()
         else:
-            self._unarchive(src, dst, members, format, deletesrc, trackcommand)
+            return self._unarchive(src, dst, members, format, deletesrc, trackcommand, workers)
 
     def copy(self, src:str, dst:str, delete_src:bool=False, delete_files:bool=False) -> Self:
         """
@@ -379,8 +732,199 @@ class User():
             except OSError as err: raise OSError(str(err)+'. You must set delete_files argument to True.')
         return self
 
-class Storage():
-    def __init__(self, user: User = None, filename: str = 'storage.yaml'):
+def set_executor(executor: concurrent.futures.Executor):
+    """
+    Sets the executor that the async methods run their file work on. By default a thread pool with 4 workers is used
+
+    :param executor: The executor to use
+    :type executor: concurrent.futures.Executor
+    """
+    global __executor__
+    __executor__ = executor
+
+async def _run(func, *args):
+    """Internal Function. Runs func in the executor so it does not block the event loop"""
+    global __executor__
+    if __executor__ is None: __executor__ = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix='UserFolder')
+    return await asyncio.get_running_loop().run_in_executor(__executor__, functools.partial(func, *args))
+
+class _Coalesce():
+    def __init__(self, func):
+        """Internal Class. Runs func once for every group of coroutines that are waiting for it at the same time"""
+        self.func = func
+        self.pending = None
+
+    async def __call__(self):
+        if self.pending is None: self.pending = asyncio.ensure_future(self._run())
+        await asyncio.shield(self.pending)
+
+    async def _run(self):
+        await asyncio.sleep(0) # Let other coroutines add their changes first
+        self.pending = None # Changes made after this need another run
+        await _run(self.func)
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+@contextlib.contextmanager
+def _file_lock(path: str):
+    """Internal Function. Holds an exclusive lock on path so only one process at a time can run the block"""
+    with open(path, 'a+b') as f:
+        if fcntl is not None: fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try: yield
+        finally:
+            if fcntl is not None: fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _copy_file(src, dst, chunk: int = 1024 * 1024) -> int:
+    """Internal Function. Copies the open binary file src into the empty file dst without reading it into memory. Tries a reflink, then copy_file_range, then sendfile and then a fixed size buffer"""
+    src_fd, dst_fd = src.fileno(), dst.fileno()
+    size = os.fstat(src_fd).st_size
+    if fcntl is not None and sys.platform.startswith('linux'):
+        try:
+            fcntl.ioctl(dst_fd, 0x40049409, src_fd) # FICLONE, shares the blocks on btrfs/xfs
+            return size
+        except OSError: pass
+    copied = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while copied < size:
+                n = os.copy_file_range(src_fd, dst_fd, size - copied, copied, copied)
+                if n == 0: break
+                copied += n
+            return copied
+        except OSError: pass
+    if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+        try:
+            os.lseek(dst_fd, copied, os.SEEK_SET)
+            while copied < size:
+                n = os.sendfile(dst_fd, src_fd, copied, size - copied)
+                if n == 0: break
+                copied += n
+            return copied
+        except OSError: pass
+    src.seek(copied)
+    dst.seek(copied)
+    while buf := src.read(chunk):
+        dst.write(buf)
+        copied += len(buf)
+    return copied
+
+def _write_atomic(path: str, data: bytes):
+    """Internal Function. Writes data to a temp file and moves it over path, so readers never see a partly written file"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path)+'.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as w: w.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+try:
+    _SafeLoader, _SafeDumper, _FullLoader, _Dumper = yaml.CSafeLoader, yaml.CSafeDumper, yaml.CFullLoader, yaml.CDumper
+except AttributeError: # PyYAML was installed without libyaml
+    _SafeLoader, _SafeDumper, _FullLoader, _Dumper = yaml.SafeLoader, yaml.SafeDumper, yaml.FullLoader, yaml.Dumper
+
+def _yaml_load(stream, all: bool = False):
+    load = yaml.load_all if all else yaml.load
+    try: return list(load(stream, _SafeLoader)) if all else load(stream, _SafeLoader)
+    except yaml.constructor.ConstructorError: # Uses python tags such as !!python/tuple
+        return list(load(stream, _FullLoader)) if all else load(stream, _FullLoader)
+
+def _yaml_dump(data, **kw) -> str:
+    try: return yaml.dump(data, Dumper=_SafeDumper, **kw)
+    except yaml.representer.RepresenterError: return yaml.dump(data, Dumper=_Dumper, **kw)
+
+def _yaml_check(data):
+    """Internal Function. Raises a TypeError when data can not be read back after it is written as YAML"""
+    try: yaml.dump(data, Dumper=_SafeDumper)
+    except yaml.representer.RepresenterError:
+        try: _yaml_load(yaml.dump(data, Dumper=_Dumper))
+        except yaml.YAMLError as e: raise TypeError(f'The value can not be read back from YAML: {e.problem}') from e
+
+class Serializer():
+    def __init__(self, name: str, loads, dumps, magic: bytes = None, extensions: list = []):
+        """
+        A file format that Storage can use
+
+        :param name: The name of the format
+        :type name: str
+        :param loads: Function that converts the bytes of the file to a dict
+        :type loads: Function
+        :param dumps: Function that converts a dict to bytes
+        :type dumps: Function
+        :param magic: The bytes that files in this format start with. Used to detect the format of existing files, defaults to None
+        :type magic: bytes, optional
+        :param extensions: The file extensions used for this format, defaults to []
+        :type extensions: list, optional
+        """
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+        self.magic = magic
+        self.extensions = extensions
+
+    def __str__(self):
+        return f'Serializer(name="{self.name}")'
+
+__serializers__ = {}
+
+def register_serializer(serializer: Serializer) -> Serializer:
+    """
+    Adds a file format that can be used by Storage
+
+    :param serializer: The format to add
+    :type serializer: Serializer
+    :rtype: Serializer
+    """
+    __serializers__[serializer.name] = serializer
+    return serializer
+
+def get_serializer(name: str) -> Serializer:
+    """
+    Returns the file format with this name
+
+    :param name: The name of the format. 'yaml', 'json', 'pickle' or any registered format
+    :type name: str
+    :rtype: Serializer
+    """
+    try: return __serializers__[name]
+    except KeyError: raise ValueError(f"Unknown serializer: '{name}'. Available serializers: {', '.join(__serializers__)}")
+
+def _detect_serializer(path: str, default: str = 'yaml', pickle: bool = False) -> Serializer:
+    """Internal Function. Detects the format of an existing file from its first bytes, or a new file from its extension. Pickle can run code when it is read, so it is only detected when pickle is true"""
+    try:
+        with open(path, 'rb') as r: head = r.read(16).lstrip()
+    except FileNotFoundError: head = b''
+    for serializer in __serializers__.values():
+        if head and serializer.magic and head.startswith(serializer.magic):
+            if serializer.name == 'pickle' and pickle == False:
+                raise ValueError(f"'{path}' is stored as pickle, which can run code when it is read. Open it with serializer='pickle' if you trust the file, and call migrate('yaml') to convert it.")
+            return serializer
+    if head: return get_serializer('yaml')
+    ext = os.path.splitext(path)[1].lower()
+    for serializer in __serializers__.values():
+        if ext in serializer.extensions and (serializer.name != 'pickle' or pickle): return serializer
+    return get_serializer(default)
+
+register_serializer(Serializer('yaml', _yaml_load, lambda data: _yaml_dump(data, sort_keys=False).encode('utf-8'), extensions=['.yaml', '.yml']))
+register_serializer(Serializer('json', json.loads, lambda data: json.dumps(data).encode('utf-8'), b'{"', ['.json'])) # An empty file is written for no data, '{}' is YAML
+register_serializer(Serializer('pickle', pickle.loads, lambda data: pickle.dumps(data, pickle.HIGHEST_PROTOCOL), b'\x80', ['.pickle', '.pkl', '.bin']))
+
+class Storage(collections.abc.MutableMapping):
+    JOURNAL_MIN_SIZE = 64 * 1024
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+    def __init__(self, user: User = None, filename: str = 'storage.yaml', autoflush: bool = True, journal: bool = False, compact_ratio: float = 1.0, serializer: str = None, blob_threshold: int = None):
         """
         Create a file to store key/value pairs
 
@@ -388,57 +932,357 @@ class Storage():
         :type user: User, optional
         :param filename: The name of the file to store all values, defaults to 'storage.yaml'
         :type filename: str, optional
+        :param autoflush: When true every change is written to the file right away, otherwise changes are kept in memory until `flush` is called, defaults to True
+        :type autoflush: bool, optional
+        :param journal: When true changes are appended to a journal file next to the storage file instead of rewriting the whole file. An existing journal is always read, and is folded into the file when it is rewritten. Journal records are YAML, so values must also be storable as YAML, defaults to False
+        :type journal: bool, optional
+        :param compact_ratio: The journal is compacted into the storage file once it is this many times larger than the storage file, defaults to 1.0
+        :type compact_ratio: float, optional
+        :param serializer: The file format. 'yaml', 'json' or 'pickle'. When undefined the format of an existing file is detected, except pickle which must always be given, defaults to None
+        :type serializer: str, optional
+        :param blob_threshold: Bytes values larger than this many bytes are stored in their own file and read back as a memoryview, defaults to None
+        :type blob_threshold: int, optional
         """
         if user is None:
             user = get_user()
         self.user = user
         self.filename = filename
         self.file = user.join(filename)
+        self.journal_file = self.file + '.journal'
+        self.lock_file = self.file + '.lock'
+        self.blob_path = self.file + '.blobs'
+        self.blob_threshold = blob_threshold
         self.first = False
+        self.autoflush = autoflush
+        self.journal = journal
+        self.compact_ratio = compact_ratio
+        self._data = {}
+        self._keys = None
+        self._stat = None
+        self._dirty = False
+        self._pending = []
+        self._blobs = {}
+        self._garbage = []
+        self._created = [] # Blobs written since the last flush, deleted again when a batch is rolled back
+        self._lock = threading.RLock()
+        self._compactor = None
+        self._compact_lock = threading.Lock()
+        self._aflush = _Coalesce(self.flush)
+        detected = _detect_serializer(self.file, pickle=serializer == 'pickle')
+        if serializer is not None and os.path.exists(self.file) and os.path.getsize(self.file) > 0 and detected.name != serializer:
+            raise ValueError(f"'{filename}' is stored as {detected.name}, not {serializer}. Open it without a serializer and call migrate('{serializer}') to convert it.")
+        self._serializer = detected if serializer is None else get_serializer(serializer)
         # Create file
         if os.path.exists(self.file) == False:
-            wrt = self.user.open(self.file, 'w')
-            wrt.write('')
-            wrt.close()
+            self.user.open(self.file, 'a').close()
             self.first = True
 
-        self.length = self._len()
+        self._load()
+
+        global __root__
+        __root__['storage'].add(self)
 
     def __str__(self):
         name  = os.path.basename(self.filename)
         return f'Storage(filename="{name}")'
     
-    def _len(self):
-        opn = self.user.open(self.file, 'r')
-        data = yaml.load(opn, yaml.FullLoader)
-        opn.close()
-        if data != None:
-            count = 0
-            for i in data:
-                count += 1
-            return count
-        else:
-            return 0
+    def __len__(self):
+        return len(self._load())
+
+    def __iter__(self):
+        return iter(self._index())
+
+    def __getitem__(self, key: str):
+        return self.get_item(key)
+
+    def __setitem__(self, key: str, value):
+        self.set_item(key, value)
+
+    def __delitem__(self, key: str):
+        self.remove_item(key)
+
+    def __contains__(self, key: str) -> bool:
+        return self.exists(key)
 
-    def get_item(self, key: str):
+    def keys(self):
         """
-        The current value associated with the given key, or null if the given key does not exist.
+        Yields every key in insertion order
+
+        :rtype: Generator[str]
+        """
+        yield from list(self._index())
+
+    def values(self):
+        """
+        Yields every value in insertion order
+
+        :rtype: Generator[Any]
+        """
+        for key, value in self.items(): yield value
+
+    def items(self):
+        """
+        Yields every key/value pair in insertion order, reading the file at most once
+
+        :rtype: Generator[tuple[str, Any]]
+        """
+        for key, value in list(self._load().items()): yield key, self._value(value)
+
+    @property
+    def length(self) -> int:
+        """The number of key/value pairs"""
+        return len(self._load())
+
+    def _index(self) -> list:
+        """Internal Function. Returns the keys in insertion order, only rebuilding the list after keys were removed or the file was re-read"""
+        data = self._load()
+        if self._keys is None: self._keys = list(data)
+        return self._keys
+
+    def _file_stat(self):
+        stat = []
+        for fp in (self.file, self.journal_file):
+            try:
+                st = os.stat(fp)
+                stat.append((st.st_ino, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stat.append(None)
+        return tuple(stat)
+
+    def _read(self):
+        """Internal Function. Reads the data from the files, returns the data and the stat of the files it was read from"""
+        stat = self._file_stat()
+        while True:
+            if stat[0] is None: data = None
+            else:
+                with open(self.file, 'rb') as r: raw = r.read()
+                data = self._serializer.loads(raw) if raw.strip() else None
+            if data == None: data = {}
+            if stat[1] is not None: self._replay(data) # Also replay a journal left by a store that was opened with journal=True
+            # Read again if the files were replaced while reading them
+            new = self._file_stat()
+            if new == stat: return data, stat
+            stat = new
+
+    def _load(self) -> dict:
+        """Internal Function. Returns the parsed data, only re-parsing the file when it has changed on disk"""
+        if self._dirty: return self._data
+        with self._lock:
+            if self._file_stat() != self._stat:
+                self._data, self._stat = self._read()
+                self._keys = None
+            return self._data
+
+    def _replay(self, data: dict):
+        """Internal Function. Applies every complete record in the journal to data"""
+        with open(self.journal_file, 'r') as r: text = r.read()
+        # Every record ends with '...', anything after the last one was only partly written
+        end = text.rfind('\n...\n')
+        if end == -1: return
+        for text in text[:end].split('\n...\n'):
+            try: record = _yaml_load(text)
+            except yaml.YAMLError: continue # Damaged, skip it
+            self._apply(data, record)
+
+    @staticmethod
+    def _repair_journal(a):
+        """Internal Function. Cuts off a record that was only partly written by a process that crashed, so the next record is not appended to it"""
+        size = a.seek(0, os.SEEK_END)
+        if size == 0: return
+        a.seek(max(size - 5, 0))
+        if a.read() == b'\n...\n': return
+        a.seek(0)
+        end = a.read().rfind(b'\n...\n')
+        a.truncate(end + 5 if end != -1 else 0)
+
+    @staticmethod
+    def _apply(data: dict, record: list):
+        match record: # Anything else is ignored
+            case ['set', str(key), value]: data[key] = value
+            case ['del', str(key)]: data.pop(key, None)
+            case ['clear']: data.clear()
+
+    def _dump(self):
+        """Internal Function"""
+        with self._lock, _file_lock(self.lock_file):
+            stat = self._file_stat()
+            if self.journal:
+                with open(self.journal_file, 'a+b') as a:
+                    self._repair_journal(a)
+                    a.write(''.join(_yaml_dump(record, explicit_start=True, explicit_end=True) for record in self._pending).encode('utf-8'))
+                # When another process has also written to the journal it is read again on the next lookup
+                if stat == self._stat: self._stat = self._file_stat()
+            else:
+                if stat != self._stat:
+                    # Another process has written to the file, apply our changes on top of its data
+                    self._data, self._stat = self._read()
+                    self._keys = None
+                    for record in self._pending: self._apply(self._data, record)
+                _write_atomic(self.file, self._serializer.dumps(self._data) if self._data else b'')
+                if stat[1] is not None: os.remove(self.journal_file) # Its records are in the file now
+                self._stat = self._file_stat()
+            self._pending.clear()
+            self._created.clear()
+            self._dirty = False
+            # Delete blobs that are no longer used now that the file no longer points to them
+            for name in self._garbage:
+                self._blobs.pop(name, None)
+                try: os.remove(os.path.join(self.blob_path, name))
+                except OSError: pass
+            self._garbage.clear()
+        # Compact in the background once the journal has grown too large
+        if self.journal and self._journal_full(): self.compact(wait=False)
+
+    def _changed(self, *record):
+        self._dirty = True
+        self._pending.append(list(record))
+        if self.autoflush: self._dump()
+
+    def _journal_full(self) -> bool:
+        snapshot, journal = (s[2] if s else 0 for s in self._file_stat())
+        return journal > max(snapshot * self.compact_ratio, self.JOURNAL_MIN_SIZE)
+
+    def _compact(self, force: bool = True):
+        """Internal Function"""
+        with self._compact_lock:
+            with self._lock:
+                self.flush()
+                with _file_lock(self.lock_file):
+                    if force == False and self._journal_full() == False: return
+                    self._data, self._stat = self._read()
+                    self._keys = None
+                    stat = self._stat
+                    data = dict(self._data)
+            # Write the snapshot without holding the locks so writes can continue
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.file), prefix=os.path.basename(self.file)+'.', suffix='.tmp')
+            with os.fdopen(fd, 'wb') as w: w.write(self._serializer.dumps(data) if data else b'')
+            with self._lock, _file_lock(self.lock_file):
+                current = self._file_stat()
+                if current[0] != stat[0] or (current[1] and stat[1] and current[1][0] != stat[1][0]):
+                    os.remove(tmp) # Another process has compacted the files
+                    return
+                os.replace(tmp, self.file)
+                # Keep any records that were appended while the snapshot was written
+                offset = stat[1][2] if stat[1] else 0
+                try:
+                    with open(self.journal_file, 'rb') as r:
+                        r.seek(offset)
+                        tail = r.read()
+                    _write_atomic(self.journal_file, tail)
+                except FileNotFoundError: tail = b''
+                if tail == b'': self._stat = self._file_stat()
+
+    def compact(self, wait: bool = True) -> Self:
+        """
+        Writes all values to the storage file and empties the journal
+
+        :param wait: When false the compaction will run in a new thread, defaults to True
+        :type wait: bool, optional
+        :rtype: Storage
+        """
+        if wait: self._compact()
+        elif self._compactor is None or self._compactor.is_alive() == False:
+            self._compactor = threading.Thread(target=self._compact, args=[False], daemon=True)
+            self._compactor.start()
+        return self
+
+    def flush(self) -> Self:
+        """
+        Writes all changes that are only in memory to the storage file
+
+        :rtype: Storage
+        """
+        with self._lock:
+            if self._dirty: self._dump()
+        return self
+
+    def __del__(self):
+        # Write the changes that are only in memory when the storage is garbage collected before the script ends
+        try: self.flush()
+        except Exception: pass
+
+    @property
+    def serializer(self) -> str:
+        """The name of the file format"""
+        return self._serializer.name
+
+    def migrate(self, serializer: str) -> Self:
+        """
+        Converts the storage file to another format
+
+        :param serializer: The format to convert to. 'yaml', 'json' or 'pickle'
+        :type serializer: str
+        :rtype: Storage
+        """
+        new = get_serializer(serializer)
+        with self._compact_lock, self._lock:
+            self.flush()
+            with _file_lock(self.lock_file):
+                # Read with the old format before writing with the new one
+                data, stat = self._read()
+                self._serializer = new
+                _write_atomic(self.file, new.dumps(data) if data else b'')
+                if stat[1] is not None: os.remove(self.journal_file) # Its records are in the file now
+                self._data, self._stat = data, self._file_stat()
+                self._keys = None
+        return self
+
+    @staticmethod
+    def _is_blob(value) -> bool:
+        return isinstance(value, dict) and '$blob' in value
+
+    def _write_blob(self, value) -> dict:
+        """Internal Function. Writes value to its own file and returns the reference that is stored instead"""
+        name = uuid.uuid4().hex
+        os.makedirs(self.blob_path, exist_ok=True)
+        _write_atomic(os.path.join(self.blob_path, name), value)
+        self._created.append(name)
+        return {'$blob': name, 'size': memoryview(value).nbytes}
+
+    def _read_blob(self, ref: dict) -> memoryview:
+        """Internal Function. Returns a memoryview over the memory-mapped blob file"""
+        name = ref['$blob']
+        view = self._blobs.get(name)
+        if view is None:
+            with open(os.path.join(self.blob_path, name), 'rb') as r:
+                view = memoryview(mmap.mmap(r.fileno(), 0, access=mmap.ACCESS_READ))
+            self._blobs[name] = view
+        return view
+
+    def _value(self, value):
+        if self._is_blob(value): return self._read_blob(value)
+        # Return a copy of lists, dicts and sets so changing it can not change the stored value without writing it
+        return copy.deepcopy(value) if isinstance(value, (list, dict, set)) else value
+
+    def get_item(self, key: str, default=__unset__):
+        """
+        The current value associated with the given key, or null if the given key does not exist. Lists, dicts and sets are returned as a copy, call `set_item` to change them. Values stored as a blob are returned as a read-only memoryview
 
         :param key: Get the value of the key
         :type key: str
+        :param default: The value to return if the key does not exist. When undefined a KeyError is raised instead
+        :type default: Any, optional
         :rtype: Any
         """
-        opn = self.user.open(self.file, 'r')
-        data = yaml.load(opn, yaml.FullLoader)
-        opn.close()
-        if data != None:
-            if str(key) in data:
-                return data[str(key)]
-            else:
-                raise KeyError(key)
+        data = self._load()
+        if str(key) in data:
+            return self._value(data[str(key)])
+        elif default is not __unset__:
+            return default
         else:
             raise KeyError(key)
-    get = get_item
+
+    def get(self, key: str, default=None):
+        """
+        The current value associated with the given key, or default if the given key does not exist. Unlike `get_item` this never raises a KeyError, like `dict.get`
+
+        :param key: Get the value of the key
+        :type key: str
+        :param default: The value to return if the key does not exist, defaults to None
+        :type default: Any, optional
+        :rtype: Any
+        """
+        return self.get_item(key, default)
 
     def set_item(self, key: str, value: str) -> Self:
         """
@@ -450,19 +1294,17 @@ class Storage():
         :type value: str
         :rtype: Storage
         """
-        opn = self.user.open(self.file, 'r')
-        data = yaml.load(opn, yaml.FullLoader)
-        opn.close()
-
-        if data != None:
-            data[str(key)] = value
-        else:
-            data = {}
-            data[str(key)] = value
-
-        wrt = self.user.open(self.file, 'w')
-        wrt.write(yaml.dump(data))
-        wrt.close()
+        data = self._load()
+        blob = self.blob_threshold is not None and isinstance(value, (bytes, bytearray, memoryview)) and memoryview(value).nbytes > self.blob_threshold
+        # Raises before anything is changed when the format can not store the value. Journal records are always YAML
+        record = {str(key): {'$blob': '', 'size': 0} if blob else value}
+        if self.journal or self._serializer.name == 'yaml': _yaml_check(record)
+        if self._serializer.name != 'yaml': self._serializer.dumps(record)
+        if blob: value = self._write_blob(value)
+        if self._is_blob(data.get(str(key))): self._garbage.append(data[str(key)]['$blob'])
+        if self._keys is not None and str(key) not in data: self._keys.append(str(key))
+        data[str(key)] = value
+        self._changed('set', str(key), value)
         return self
     set = set_item
 
@@ -474,19 +1316,14 @@ class Storage():
         :type key: str
         :rtype: Storage
         """
-        opn = self.user.open(self.file, 'r')
-        data = yaml.load(opn, yaml.FullLoader)
-        opn.close()
-
-        if data != None:
-            if str(key) in data:
-                del data[str(key)]
-            else:
-                raise KeyError(key)
-
-            wrt = self.user.open(self.file, 'w')
-            wrt.write(yaml.dump(data))
-            wrt.close()
+        data = self._load()
+        if str(key) in data:
+            if self._is_blob(data[str(key)]): self._garbage.append(data[str(key)]['$blob'])
+            del data[str(key)]
+            self._keys = None
+        else:
+            raise KeyError(key)
+        self._changed('del', str(key))
         return self
     remove = remove_item
 
@@ -496,11 +1333,119 @@ class Storage():
 
         :rtype: Storage
         """
-        wrt = self.user.open(self.file, 'w')
-        wrt.write('')
-        wrt.close()
+        self._garbage.extend(value['$blob'] for value in self._load().values() if self._is_blob(value))
+        self._data = {}
+        self._keys = None
+        self._changed('clear')
         return self
 
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Groups changes so they are written to the file once when the block ends. If the block raises an error all changes made inside it are discarded
+
+        Example
+        ---
+        ```
+        with storage.batch():
+            storage.set_item('a', 1)
+            storage.remove_item('b')
+        ```
+        """
+        with self._lock:
+            data = self._load()
+            backup = (dict(data), len(self._pending), len(self._garbage), len(self._created), self._dirty, self.autoflush)
+            self.autoflush = False
+            try:
+                yield self
+            except BaseException:
+                self._data, pending, garbage, created, self._dirty, self.autoflush = backup
+                self._keys = None
+                del self._pending[pending:]
+                del self._garbage[garbage:]
+                for name in self._created[created:]: # Nothing points to the blobs written inside the block
+                    try: os.remove(os.path.join(self.blob_path, name))
+                    except OSError: pass
+                del self._created[created:]
+                raise
+            self.autoflush = backup[5]
+            if self.autoflush: self.flush()
+
+    def update(self, mapping: dict = None, **kwargs) -> Self:
+        """
+        Sets multiple key/value pairs, writing the file once
+
+        :param mapping: The key/value pairs to set, defaults to None
+        :type mapping: dict, optional
+        :rtype: Storage
+        """
+        with self.batch():
+            for key, value in dict(mapping or {}, **kwargs).items():
+                self.set_item(key, value)
+        return self
+
+    def remove_many(self, keys: list) -> Self:
+        """
+        Removes multiple key/value pairs, writing the file once. If any key does not exist nothing is removed
+
+        :param keys: The keys to remove
+        :type keys: list
+        :rtype: Storage
+        """
+        with self.batch():
+            for key in keys:
+                self.remove_item(key)
+        return self
+
+    def _deferred(self, func, *args):
+        """Internal Function. Runs func without writing the changes to the file"""
+        with self._lock:
+            autoflush = self.autoflush
+            self.autoflush = False
+            try: return func(*args)
+            finally: self.autoflush = autoflush
+
+    async def aget_item(self, key: str, default=__unset__):
+        """
+        Async version of `get_item`
+
+        :param key: Get the value of the key
+        :type key: str
+        :param default: The value to return if the key does not exist. When undefined a KeyError is raised instead
+        :type default: Any, optional
+        :rtype: Any
+        """
+        return await _run(self.get_item, key, default)
+    aget = aget_item
+
+    async def aset_item(self, key: str, value: str) -> Self:
+        """
+        Async version of `set_item`. Changes made by coroutines at the same time are written to the file once
+
+        :param key: The key to set
+        :type key: str
+        :param value: The value of the key to set
+        :type value: str
+        :rtype: Storage
+        """
+        await _run(self._deferred, self.set_item, key, value)
+        if self.autoflush: await self._aflush()
+        return self
+    aset = aset_item
+
+    async def aremove_item(self, key: str) -> Self:
+        """
+        Async version of `remove_item`. Changes made by coroutines at the same time are written to the file once
+
+        :param key: The key/value pair to remove
+        :type key: str
+        :rtype: Storage
+        """
+        await _run(self._deferred, self.remove_item, key)
+        if self.autoflush: await self._aflush()
+        return self
+    aremove = aremove_item
+
     def key(self, index: int) -> str|None:
         """
         Returns the name of the nth key, or None if n is greater than or equal to the number of key/value pairs
@@ -510,19 +1455,9 @@ class Storage():
         :return: str - Name of the key, None - Index out of bounds error
         :rtype: str|None
         """
-        opn = self.user.open(self.file, 'r')
-        data = yaml.load(opn, yaml.FullLoader)
-        opn.close()
-        if data != None:
-            # get all keys in a list
-            keys = []
-            for k in data:
-                keys.append(k)
-            try:
-                return keys[int(index)]
-            except IndexError:
-                return None
-        else:
+        try:
+            return self._index()[int(index)]
+        except IndexError:
             return None
 
     def exists(self, key: str) -> bool:
@@ -533,11 +1468,7 @@ class Storage():
         :type key: str
         :rtype: bool
         """
-        try:
-            self.getItem(key)
-            return True
-        except KeyError:
-            return False
+        return str(key) in self._load()
 
     def show(self) -> None:
         """
@@ -545,6 +1476,7 @@ class Storage():
 
         :rtype: None
         """
+        self.flush()
         return os.startfile(self.file)
 
     def destroy(self) -> Self:
@@ -553,35 +1485,310 @@ class Storage():
 
         :rtype: Storage
         """
-        try: self.user.remove(self.file)
-        except OSError: pass
+        self._data = {}
+        self._keys = None
+        self._dirty = False
+        self._pending.clear()
+        self._blobs.clear()
+        self._garbage.clear()
+        for fp in (self.file, self.journal_file, self.lock_file):
+            try: self.user.remove(fp)
+            except OSError: pass
+        if os.path.isdir(self.blob_path):
+            try: self.user.remove(self.blob_path, True)
+            except OSError: pass
         del self
 
 class localStorage(Storage):
-    def __init__(self, user: User = None):
+    def __init__(self, user: User = None, autoflush: bool = True, journal: bool = False, serializer: str = None, blob_threshold: int = None):
         """
         General storage class. Allows you to store key/values in the user folder
 
         :param user: The User class for the local storage, defaults to None
         :type user: User, optional
-        """
-        super().__init__(user, 'localStorage.yaml')
+        :param autoflush: When true every change is written to the file right away, defaults to True
+        :type autoflush: bool, optional
+        :param journal: When true changes are appended to a journal file instead of rewriting the whole file, defaults to False
+        :type journal: bool, optional
+        :param serializer: The file format. 'yaml', 'json' or 'pickle'. When undefined the format of an existing file is detected, except pickle which must always be given, defaults to None
+        :type serializer: str, optional
+        :param blob_threshold: Bytes values larger than this many bytes are stored in their own file, defaults to None
+        :type blob_threshold: int, optional
+        """
+        super().__init__(user, 'localStorage.yaml', autoflush, journal, serializer=serializer, blob_threshold=blob_threshold)
         global __root__
         __root__['localStorage'] = self
 
 class sessionStorage(Storage):
-    def __init__(self, user: User = None):
+    def __init__(self, user: User = None, autoflush: bool = True, journal: bool = False, serializer: str = None, blob_threshold: int = None):
         """
         Simlar to localStorage but gets cleared everytime the program starts
 
         :param user: The User class for the session storage, defaults to None
         :type user: User, optional
+        :param autoflush: When true every change is written to the file right away, defaults to True
+        :type autoflush: bool, optional
+        :param journal: When true changes are appended to a journal file instead of rewriting the whole file, defaults to False
+        :type journal: bool, optional
+        :param serializer: The file format. 'yaml', 'json' or 'pickle', defaults to None
+        :type serializer: str, optional
+        :param blob_threshold: Bytes values larger than this many bytes are stored in their own file, defaults to None
+        :type blob_threshold: int, optional
         """
-        super().__init__(user, '.session/%s.yaml' % (uuid.uuid4().hex))
+        super().__init__(user, '.session/%s.yaml' % (uuid.uuid4().hex), autoflush, journal, serializer=serializer, blob_threshold=blob_threshold)
 
         global __root__
         __root__['sessionStorage'].append(self)
 
+class SQLiteStorage(Storage):
+    def __init__(self, user: User = None, filename: str = 'storage.db', autoflush: bool = True, serializer: str = None):
+        """
+        Key/value storage kept in a SQLite database. Reading or writing a single key does not depend on how many keys are stored
+
+        :param user: The User class for the storage, defaults to None
+        :type user: User, optional
+        :param filename: The name of the database file, defaults to 'storage.db'
+        :type filename: str, optional
+        :param autoflush: When true every change is committed right away, otherwise changes are committed when `flush` is called, defaults to True
+        :type autoflush: bool, optional
+        :param serializer: The format used to store each value. 'yaml', 'json' or 'pickle'. When undefined the format of an existing database is used, defaults to None
+        :type serializer: str, optional
+        """
+        if user is None:
+            user = get_user()
+        self.user = user
+        self.filename = filename
+        self.file = user.join(filename)
+        self.first = os.path.exists(self.file) == False
+        self.autoflush = autoflush
+        self._lock = threading.RLock()
+        self._aflush = _Coalesce(self.flush)
+        self._batch = 0
+        os.makedirs(os.path.dirname(self.file), exist_ok=True)
+        self._db = sqlite3.connect(self.file, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL UNIQUE, value BLOB)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        row = self._db.execute('SELECT value FROM meta WHERE key = ?', ('serializer',)).fetchone()
+        if row is not None and serializer is not None and row[0] != serializer:
+            raise ValueError(f"'{filename}' is stored as {row[0]}, not {serializer}. Open it without a serializer and call migrate('{serializer}') to convert it.")
+        self._serializer = get_serializer(row[0] if row is not None else serializer or 'pickle')
+        if row is None:
+            self._db.execute('INSERT INTO meta (key, value) VALUES (?, ?)', ('serializer', self._serializer.name))
+        self._db.commit()
+
+        global __root__
+        __root__['storage'].add(self)
+
+    def __str__(self):
+        name  = os.path.basename(self.filename)
+        return f'SQLiteStorage(filename="{name}")'
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+    def __iter__(self):
+        return self.keys()
+
+    def _rows(self, sql: str, size: int = 1000):
+        """Internal Function. Yields the rows of a query, fetching them in chunks"""
+        with self._lock: cursor = self._db.execute(sql)
+        while True:
+            with self._lock: rows = cursor.fetchmany(size)
+            if not rows: break
+            yield from rows
+
+    def keys(self):
+        """
+        Yields every key in insertion order
+
+        :rtype: Generator[str]
+        """
+        for row in self._rows('SELECT key FROM items ORDER BY id'): yield row[0]
+
+    def items(self):
+        """
+        Yields every key/value pair in insertion order
+
+        :rtype: Generator[tuple[str, Any]]
+        """
+        for key, value in self._rows('SELECT key, value FROM items ORDER BY id'): yield key, self._serializer.loads(value)
+
+    @property
+    def length(self) -> int:
+        """The number of key/value pairs"""
+        return len(self)
+
+    def _load(self) -> dict:
+        """Internal Function. Returns every key/value pair"""
+        with self._lock:
+            rows = self._db.execute('SELECT key, value FROM items ORDER BY id').fetchall()
+        return {key: self._serializer.loads(value) for key, value in rows}
+
+    def _changed(self):
+        if self.autoflush and self._db.in_transaction and self._batch == 0: self._db.commit()
+
+    def flush(self) -> Self:
+        """
+        Commits all changes that have not been committed yet
+
+        :rtype: SQLiteStorage
+        """
+        with self._lock:
+            if self._db.in_transaction and self._batch == 0: self._db.commit()
+        return self
+
+    def compact(self, wait: bool = True) -> Self:
+        """
+        Writes the write-ahead log into the database and frees unused space
+
+        :param wait: Unused, SQLite always compacts right away, defaults to True
+        :type wait: bool, optional
+        :rtype: SQLiteStorage
+        """
+        with self._lock:
+            self.flush()
+            self._db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self._db.execute('VACUUM')
+        return self
+
+    def migrate(self, serializer: str) -> Self:
+        """
+        Converts every value to another format
+
+        :param serializer: The format to convert to. 'yaml', 'json' or 'pickle'
+        :type serializer: str
+        :rtype: SQLiteStorage
+        """
+        with self.batch():
+            new = get_serializer(serializer)
+            rows = self._db.execute('SELECT id, value FROM items').fetchall()
+            self._db.executemany('UPDATE items SET value = ? WHERE id = ?', ((new.dumps(self._serializer.loads(value)), id) for id, value in rows))
+            self._db.execute('UPDATE meta SET value = ? WHERE key = ?', (new.name, 'serializer'))
+            self._serializer = new
+        return self
+
+    def get_item(self, key: str, default=__unset__):
+        """
+        The current value associated with the given key, or null if the given key does not exist.
+
+        :param key: Get the value of the key
+        :type key: str
+        :param default: The value to return if the key does not exist. When undefined a KeyError is raised instead
+        :type default: Any, optional
+        :rtype: Any
+        """
+        with self._lock:
+            row = self._db.execute('SELECT value FROM items WHERE key = ?', (str(key),)).fetchone()
+        if row is None:
+            if default is not __unset__: return default
+            raise KeyError(key)
+        return self._serializer.loads(row[0])
+
+    def set_item(self, key: str, value: str) -> Self:
+        """
+        Sets the value of the pair identified by key to value, creating a new key/value pair if none existed for key previously
+
+        :param key: The key to set
+        :type key: str
+        :param value: The value of the key to set
+        :type value: str
+        :rtype: SQLiteStorage
+        """
+        with self._lock:
+            self._db.execute('INSERT INTO items (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value', (str(key), self._serializer.dumps(value)))
+            self._changed()
+        return self
+    set = set_item
+
+    def remove_item(self, key: str) -> Self:
+        """
+        Removes the key/value pair with the given key, if a key/value pair with the given key exists
+
+        :param key: The key/value pair to remove
+        :type key: str
+        :rtype: SQLiteStorage
+        """
+        with self._lock:
+            if self._db.execute('DELETE FROM items WHERE key = ?', (str(key),)).rowcount == 0:
+                raise KeyError(key)
+            self._changed()
+        return self
+    remove = remove_item
+
+    def clear(self) -> Self:
+        """
+        Removes all key/value pairs, if there are any
+
+        :rtype: SQLiteStorage
+        """
+        with self._lock:
+            self._db.execute('DELETE FROM items')
+            self._changed()
+        return self
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Groups changes into one transaction that is committed when the block ends. If the block raises an error all changes made inside it are rolled back
+        """
+        with self._lock:
+            name = 'batch%s' % self._batch
+            self._db.execute(f'SAVEPOINT {name}')
+            self._batch += 1
+            try:
+                yield self
+            except BaseException:
+                self._db.execute(f'ROLLBACK TO {name}')
+                raise
+            finally:
+                self._batch -= 1
+                self._db.execute(f'RELEASE {name}')
+            self._changed()
+
+    def key(self, index: int) -> str|None:
+        """
+        Returns the name of the nth key, or None if n is greater than or equal to the number of key/value pairs
+
+        :param index: The index in the store to get the key from
+        :type index: int
+        :return: str - Name of the key, None - Index out of bounds error
+        :rtype: str|None
+        """
+        index = int(index)
+        with self._lock:
+            if index < 0: index += len(self)
+            if index < 0: return None
+            row = self._db.execute('SELECT key FROM items ORDER BY id LIMIT 1 OFFSET ?', (index,)).fetchone()
+        return row[0] if row is not None else None
+
+    def exists(self, key: str) -> bool:
+        """
+        Checks if key/value pair exists
+
+        :param key: The key to test for
+        :type key: str
+        :rtype: bool
+        """
+        with self._lock:
+            return self._db.execute('SELECT 1 FROM items WHERE key = ?', (str(key),)).fetchone() is not None
+
+    def destroy(self) -> Self:
+        """
+        Delete this database file
+
+        :rtype: SQLiteStorage
+        """
+        with self._lock:
+            __root__['storage'].discard(self)
+            self._db.close()
+            for fp in (self.file, self.file+'-wal', self.file+'-shm'):
+                try: self.user.remove(fp)
+                except OSError: pass
+        del self
+
 class Config():
     def __init__(self, user: User = None, section: str = None):
         """
@@ -595,6 +1802,8 @@ class Config():
         if user is None: user = get_user()
         self.user = user
         self.registry = {}
+        self._lock = threading.RLock()
+        self._awrite = _Coalesce(self._write)
 
         # Default section is the user id
         if section is None: section = self.user.id
@@ -623,7 +1832,7 @@ class Config():
             self.config.read_string(configfile.read())
 
     def _write(self):
-        with self.user.open('.cfg', 'w') as configfile:
+        with self._lock, self.user.open('.cfg', 'w') as configfile:
             self.config.write(configfile)
 
     def section(self, name:str) -> Self:
@@ -697,11 +1906,28 @@ class Config():
         :rtype: Config
         """
         # Validate
-        self.config.set(self._section, str(key), str(value))
+        with self._lock: self.config.set(self._section, str(key), str(value))
         self._write()
         return self
     set = set_item
 
+    async def aset_item(self, key: str, value) -> Self:
+        """
+        Async version of `set_item`. Changes made by coroutines at the same time are written to the file once
+
+        :param key: The key to set
+        :type key: str
+        :param value: The value of the key to set
+        :type value: Any
+        :rtype: Config
+        """
+        def set():
+            with self._lock: self.config.set(self._section, str(key), str(value))
+        await _run(set)
+        await self._awrite()
+        return self
+    aset = aset_item
+
     def get_item(self, key: str, default=None):
         """
         Returns the current value associated with the given key, or null if the given key does not exist
@@ -716,6 +1942,19 @@ class Config():
         except configparser.NoOptionError: return default
     get = get_item
 
+    async def aget_item(self, key: str, default=None):
+        """
+        Async version of `get_item`
+
+        :param key: The key/value pair to get
+        :type key: str
+        :param default: The value to return if the option cannot be found, defaults to None
+        :type default: Any, optional
+        :rtype: Any
+        """
+        return await _run(self.get_item, key, default)
+    aget = aget_item
+
     def remove_item(self, key: str) -> bool:
         """
         Removes the key/value pair
@@ -724,13 +1963,36 @@ class Config():
         :type key: str
         :rtype: bool
         """
-        result = self.config.remove_option(self._section, str(key))
+        with self._lock: result = self.config.remove_option(self._section, str(key))
         self._write()
         return result
     remove = remove_item
 
+    async def aremove_item(self, key: str) -> bool:
+        """
+        Async version of `remove_item`. Changes made by coroutines at the same time are written to the file once
+
+        :param key: The key/value pair to remove
+        :type key: str
+        :rtype: bool
+        """
+        def remove():
+            with self._lock: return self.config.remove_option(self._section, str(key))
+        result = await _run(remove)
+        await self._awrite()
+        return result
+    aremove = aremove_item
+
 class Cache():
-    def __init__(self, id:str=None, user:User=None, root_path:str=None):
+    CHUNK_SIZE = 1024 * 1024
+    # Codec name: (file extension, open(file, mode, level))
+    CODECS = {
+        'gzip': ('.gz', lambda f, mode, level: gzip.open(f, mode, 6 if level is None else level)),
+        'bz2': ('.bz2', lambda f, mode, level: bz2.open(f, mode, 9 if level is None else level)),
+        'lzma': ('.xz', lambda f, mode, level: lzma.open(f, mode, preset=level if mode == 'wb' else None)),
+    }
+
+    def __init__(self, id:str=None, user:User=None, root_path:str=None, max_bytes:int=None, max_entries:int=None, policy:str='lru', compression:str=None, level:int=None, verify:bool=False):
         """
         Cache any file
 
@@ -740,6 +2002,18 @@ class Cache():
         :type user: User, optional
         :param root_path: The root path, defaults to None
         :type root_path: str, optional
+        :param max_bytes: The most bytes the cached objects can use. Files are evicted when more is used, defaults to None
+        :type max_bytes: int, optional
+        :param max_entries: The most files that can be cached. Files are evicted when more are cached, defaults to None
+        :type max_entries: int, optional
+        :param policy: Which files are evicted first. 'lru' - least recently used, 'lfu' - least frequently used, defaults to 'lru'
+        :type policy: str, optional
+        :param compression: Compress new objects with 'gzip', 'bz2' or 'lzma'. Files that do not compress well are stored as they are, defaults to None
+        :type compression: str, optional
+        :param level: The compression level, defaults to None
+        :type level: int, optional
+        :param verify: When true the content of every object is checked against its sha256 before it is returned, defaults to False
+        :type verify: bool, optional
         """
         global __root__
         if id is None: id = len(__root__['cache'])
@@ -752,29 +2026,329 @@ class Cache():
         self.root_path = root_path.replace('\\', '/')
 
         self.index_path = user.join('.cache', 'indexes', str(self.id)+'.json')
+        self.journal_path = user.join('.cache', 'indexes', str(self.id)+'.journal')
         self.objects_path = user.join('.cache', 'objects')
-        self.objects = {}
+        self._objects = None
+        self._refs = None
+        self._tree = None
+        self._changes = {}
+        self._extracted = {} # Hash: the read-only temp file a compressed object was decompressed to
+        self._extract_lock = threading.Lock()
+        self.last_report = None
+        if policy not in ('lru', 'lfu'): raise ValueError(f"Unknown policy: '{policy}'. Supported policies: lru, lfu")
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.policy = policy
+        if compression is not None and compression not in self.CODECS: raise ValueError(f"Unknown compression: '{compression}'. Supported compressions: {', '.join(self.CODECS)}")
+        self.compression = compression
+        self.level = level
+        self.verify = verify
+        self.quarantine_path = user.join('.cache', 'quarantine', str(self.id))
+        self._bytes = 0
+        self._dirty = False
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'bytes_evicted': 0}
         # Create
         if user.exists(self.index_path)==False:
             os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
-            self._write_index()
-
-        # Open index
-        self._read_index()
+            _write_atomic(self.index_path, json.dumps({"objects": {}, "refs": {}}).encode('utf-8'))
 
+        # The index is read the first time it is used
         __root__['cache'].append(self)
 
-    def _cache_path(self, hash:str):
-        return self.user.join('.cache', 'objects', hash[0:2], hash)
+    @property
+    def objects(self) -> dict:
+        """The index of every cached file"""
+        if self._objects is None: self._read_index()
+        return self._objects
+
+    @property
+    def refs(self) -> dict:
+        """The number of cached files that use each object"""
+        if self._objects is None: self._read_index()
+        return self._refs
+
+    @property
+    def bytes(self) -> int:
+        """The number of bytes the cached objects use on disk"""
+        if self._objects is None: self._read_index()
+        return self._bytes
+
+    def _cache_path(self, hash:str, codec:str=None):
+        if len(hash) == 32: # Objects named with a uuid before objects were named by their content
+            return self.user.join('.cache', 'objects', hash[0:2], hash)
+        ext = self.CODECS[codec][0] if codec is not None else ''
+        return self.user.join('.cache', 'objects', str(self.id), hash[0:2], hash + ext)
 
     def _read_index(self):
         with open(self.index_path, 'r') as r:
             objs = json.load(r).get('objects')
-            if objs!=None: self.objects = objs
+        if objs is None: objs = {}
+        # Apply the changes made since the index was last compacted
+        try:
+            with open(self.journal_path, 'r') as r:
+                for line in r:
+                    if line.endswith('\n') == False: break # Only partly written
+                    try: change = json.loads(line)
+                    except ValueError: continue # Damaged, skip it
+                    if change['v'] is None: objs.pop(change['k'], None)
+                    else: objs[change['k']] = change['v']
+        except FileNotFoundError: pass
+        refs = {}
+        for obj in objs.values(): refs[obj['hash']] = refs.get(obj['hash'], 0) + 1
+        self._objects = objs
+        self._refs = refs
+        self._tree = {}
+        for key in objs: self._tree_add(key)
+        self._bytes = sum({obj['hash']: obj.get('stored', obj['size']) for obj in objs.values()}.values())
+
+    def _tree_add(self, key:str):
+        """Internal Function. Adds the key to the path tree. Directories are dicts and files are their key"""
+        parts = [part for part in key.split('/') if part]
+        node = self._tree
+        for part in parts[:-1]:
+            child = node.get(part)
+            if isinstance(child, dict) == False: child = node[part] = {}
+            node = child
+        if parts: node[parts[-1]] = key
+
+    def _tree_remove(self, key:str):
+        """Internal Function. Removes the key from the path tree and the directories that are left empty"""
+        parts = [part for part in key.split('/') if part]
+        nodes = [self._tree]
+        for part in parts[:-1]:
+            child = nodes[-1].get(part)
+            if isinstance(child, dict) == False: return
+            nodes.append(child)
+        if parts and nodes[-1].get(parts[-1]) == key: del nodes[-1][parts[-1]]
+        for i in range(len(nodes) - 1, 0, -1):
+            if nodes[i]: break
+            del nodes[i - 1][parts[i - 1]]
+
+    def _subtree(self, *path:str) -> list[str]:
+        """Internal Function. Returns the keys of every file in the directory and its sub directories, or None when nothing is cached in it"""
+        if self._objects is None: self._read_index()
+        node = self._tree
+        for part in [part for part in self.key(*path).split('/') if part]:
+            node = node.get(part)
+            if isinstance(node, dict) == False: return None
+        keys = []
+        stack = [node]
+        while stack:
+            for child in stack.pop().values():
+                if isinstance(child, dict): stack.append(child)
+                else: keys.append(child)
+        return keys
 
     def _write_index(self):
-        obj = {"objects": self.objects}
-        with open(self.index_path, 'w') as w: w.write(json.dumps(obj))
+        """Internal Function. Appends the changed entries to the journal, and compacts it into the index once it has grown too large"""
+        if self._changes:
+            with open(self.journal_path, 'a+b') as a:
+                self._repair_journal(a)
+                a.write(''.join(json.dumps({"k": key, "v": entry}) + '\n' for key, entry in self._changes.items()).encode('utf-8'))
+            self._changes.clear()
+        self._dirty = False
+        try: journal = os.path.getsize(self.journal_path)
+        except FileNotFoundError: return
+        if journal > max(os.path.getsize(self.index_path), 64 * 1024): self.compact()
+
+    @staticmethod
+    def _repair_journal(a):
+        """Internal Function. Cuts off a line that was only partly written by a process that crashed, so the next line is not appended to it"""
+        size = a.seek(0, os.SEEK_END)
+        if size == 0: return
+        a.seek(size - 1)
+        if a.read(1) == b'\n': return
+        a.seek(0)
+        a.truncate(a.read().rfind(b'\n') + 1)
+
+    def compact(self) -> Self:
+        """
+        Writes the whole index to its file and empties the journal
+
+        :rtype: Cache
+        """
+        if self._changes: self._write_index()
+        _write_atomic(self.index_path, json.dumps({"objects": self.objects, "refs": self.refs}).encode('utf-8'))
+        try: os.remove(self.journal_path)
+        except FileNotFoundError: pass
+        return self
+
+    def flush(self) -> Self:
+        """
+        Writes the access times and hit counts that are only in memory to the index
+
+        :rtype: Cache
+        """
+        if self._dirty: self._write_index()
+        return self
+
+    def stats(self) -> dict:
+        """
+        Returns how well the cache is working since it was opened
+
+        :return: hits, misses, hit_rate, evictions, bytes_evicted, bytes and entries
+        :rtype: dict
+        """
+        lookups = self._stats['hits'] + self._stats['misses']
+        return dict(self._stats, hit_rate=self._stats['hits'] / lookups if lookups else 0.0, bytes=self.bytes, entries=len(self.objects))
+
+    def _evict(self, keep:str=None, order:list=None) -> bool:
+        """Internal Function. Removes the least recently or least frequently used files until the cache fits in its limits. The file keep, which was just added, is never removed. order is a heap that can be passed to every call while adding many files"""
+        def full(): return (self.max_bytes is not None and self.bytes > self.max_bytes) or (self.max_entries is not None and len(self.objects) > self.max_entries)
+        def priority(key, obj): return (obj.get('hits', 0), obj.get('atime', 0), key) if self.policy == 'lfu' else (obj.get('atime', 0), key)
+        if order is None: order = []
+        evicted = False
+        while full():
+            if not order:
+                order.extend(priority(key, obj) for key, obj in self.objects.items() if key != keep)
+                heapq.heapify(order)
+                if not order: break
+            key = heapq.heappop(order)[-1]
+            if key == keep or key not in self.objects: continue
+            before = self.bytes
+            self._del_entry(key)
+            self._stats['evictions'] += 1
+            self._stats['bytes_evicted'] += before - self.bytes
+            evicted = True
+        # The heap only holds the files that were cached when it was built, add the new file so it can be evicted later
+        if order and keep in self.objects: heapq.heappush(order, priority(keep, self.objects[keep]))
+        return evicted
+
+    def _compressible(self, rb) -> bool:
+        """Internal Function. Checks if the start of the file gets smaller when it is compressed"""
+        sample = rb.read(64 * 1024)
+        rb.seek(0)
+        return len(sample) > 0 and len(zlib.compress(sample, 1)) < len(sample) * 0.9
+
+    def _store(self, fp:str) -> dict:
+        """Internal Function. Copies the file into the objects folder, returns the sha256 of its content, its size, the codec and the size of the object"""
+        with open(fp, 'rb') as rb:
+            hash = hashlib.file_digest(rb, 'sha256').hexdigest()
+            size = os.fstat(rb.fileno()).st_size
+            for codec in [None, *self.CODECS]:
+                try: return {"hash": hash, "size": size, "stored": os.path.getsize(self._cache_path(hash, codec)), "codec": codec} # Same content is already cached
+                except FileNotFoundError: pass
+            rb.seek(0)
+            codec = self.compression if self.compression is not None and self._compressible(rb) else None
+            os.makedirs(os.path.dirname(self._cache_path(hash)), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self._cache_path(hash)), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as wb:
+                    if codec is not None:
+                        with self.CODECS[codec][1](wb, 'wb', self.level) as cw: shutil.copyfileobj(rb, cw, self.CHUNK_SIZE)
+                        if wb.tell() >= size: # Did not get smaller, store it as it is
+                            codec = None
+                            wb.seek(0)
+                            wb.truncate()
+                    if codec is None: _copy_file(rb, wb, self.CHUNK_SIZE)
+                    stored = wb.tell() if codec is not None else size
+                cache_path = self._cache_path(hash, codec)
+                os.chmod(tmp, 0o444) # Objects are handed out by path, make sure they are never written to
+                try: os.replace(tmp, cache_path)
+                except PermissionError: # Another thread has just stored the same content
+                    if os.path.exists(cache_path) == False: raise
+                    os.chmod(tmp, 0o644)
+                    os.remove(tmp)
+            except BaseException:
+                if os.path.exists(tmp): os.remove(tmp)
+                raise
+        return {"hash": hash, "size": size, "stored": stored, "codec": codec}
+
+    def _verify(self, hash:str, codec:str=None, throttle=None) -> bool:
+        """Internal Function. Checks if the content of the object still matches its sha256"""
+        if len(hash) != 64: return True # Objects named with a uuid have no checksum
+        fp = self._cache_path(hash, codec)
+        digest = hashlib.sha256()
+        try:
+            with (open(fp, 'rb') if codec is None else self.CODECS[codec][1](fp, 'rb', None)) as rb:
+                while buf := rb.read(self.CHUNK_SIZE):
+                    digest.update(buf)
+                    if throttle is not None: throttle(len(buf))
+        except (OSError, EOFError, zlib.error, lzma.LZMAError): return False # Missing or can not be decompressed
+        return digest.hexdigest() == hash
+
+    def scrub(self, workers:int=None, quarantine:bool=False, limit:int=None, trackcommand=None) -> list[str]:
+        """
+        Checks the content of every cached object against its sha256 on a thread pool. The speed is saved to `last_report`
+
+        :param workers: The number of threads that read objects, defaults to None
+        :type workers: int, optional
+        :param quarantine: When true corrupt objects are moved to the quarantine folder and their files are removed from the cache, defaults to False
+        :type quarantine: bool, optional
+        :param limit: The most bytes per second that are read, so it can run next to other work, defaults to None
+        :type limit: int, optional
+        :param trackcommand: The callback command for every object that has been checked, defaults to None
+        :type trackcommand: Function, optional
+        :return: The keys of the files whose object is missing or corrupt
+        :rtype: list[str]
+        """
+        start = time.perf_counter()
+        objs = {}
+        for obj in self.objects.values(): objs[obj['hash']] = obj
+        lock = threading.Lock()
+        read = [0]
+        def throttle(n:int):
+            with lock:
+                read[0] += n
+                wait = read[0] / limit - (time.perf_counter() - start)
+            if wait > 0: time.sleep(wait)
+        corrupt = []
+        count = 0
+        size = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='Cache') as pool:
+            futures = {pool.submit(self._verify, hash, obj.get('codec'), throttle if limit else None): hash for hash, obj in objs.items()}
+            for future in concurrent.futures.as_completed(futures):
+                hash = futures[future]
+                if future.result() == False: corrupt.append(hash)
+                count += 1
+                size += objs[hash]['size']
+                if trackcommand != None: trackcommand(TrackEvent(hash, count, len(futures)))
+        self.last_report = CacheReport(count, size, time.perf_counter() - start)
+        corrupt = set(corrupt)
+        keys = [key for key, obj in self.objects.items() if obj['hash'] in corrupt]
+        if quarantine and keys:
+            os.makedirs(self.quarantine_path, exist_ok=True)
+            for hash in corrupt:
+                fp = self._cache_path(hash, objs[hash].get('codec'))
+                try: os.replace(fp, os.path.join(self.quarantine_path, os.path.basename(fp)))
+                except FileNotFoundError: pass
+            for key in keys: self._del_entry(key)
+            self._write_index()
+        return keys
+
+    def _set_entry(self, key:str, entry:dict):
+        """Internal Function. Adds the entry to the index and updates the reference counts"""
+        old = self.objects.get(key)
+        entry.setdefault('atime', time.time())
+        entry.setdefault('hits', old.get('hits', 0) if old is not None else 0)
+        self.objects[key] = entry
+        if old is None: self._tree_add(key)
+        self._changes[key] = entry
+        if entry['hash'] not in self.refs: self._bytes += entry.get('stored', entry['size'])
+        self.refs[entry['hash']] = self.refs.get(entry['hash'], 0) + 1
+        if old is not None: self._release(old)
+
+    def _del_entry(self, key:str):
+        """Internal Function"""
+        old = self.objects.pop(key)
+        self._tree_remove(key)
+        self._changes[key] = None
+        self._release(old)
+
+    def _release(self, entry:dict):
+        """Internal Function. Removes a reference to the object and deletes it when nothing uses it anymore"""
+        hash = entry['hash']
+        count = self.refs.get(hash, 1) - 1
+        if count > 0:
+            self.refs[hash] = count
+            return
+        self.refs.pop(hash, None)
+        self._bytes -= entry.get('stored', entry['size'])
+        fp = self._cache_path(hash, entry.get('codec'))
+        try:
+            os.chmod(fp, 0o644) # Windows can not delete read-only files
+            os.remove(fp)
+        except FileNotFoundError: pass
 
     def exists(self, *path:str) -> bool:
         """
@@ -810,40 +2384,90 @@ class Cache():
         """
         fp = os.path.join(*path)
         if os.path.exists(fp) and os.path.isfile(fp):
-            hash = uuid.uuid4().hex
-            if self.exists(fp) and rewrite:
-                key = self.key(fp)
-                hash = self.objects[key]['hash']
-
             if self.exists(fp)==False or rewrite:
-                cache_path = self._cache_path(hash)
-                # Copy file
-                with open(fp, 'rb') as rb: dat = rb.read()
-                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
-                with open(cache_path, 'wb') as wb: wb.write(dat)
+                # Copy file, files with the same content share one object
+                mtime = os.stat(fp).st_mtime_ns
+                obj = self._store(fp)
                 # Add file to index
-                key = self.key(fp)
-                self.objects[str(key)] = {"hash": hash, "size": os.path.getsize(fp)}
+                self._set_entry(str(self.key(fp)), dict(obj, mtime=mtime))
+                self._evict(str(self.key(fp)))
                 self._write_index()
         else: raise CacheError(f"No such file: '{fp}'")
         return self
 
-    def add_directory(self, *path:str, rewrite:bool=False) -> Self:
+    def _scan(self, path:str) -> list[tuple[str, int, int]]:
+        """Internal Function. Returns the path, size and mtime of every file in the directory and its sub directories"""
+        files = []
+        stack = [path]
+        while stack:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(): stack.append(entry.path)
+                    elif entry.is_file():
+                        st = entry.stat()
+                        files.append((entry.path, st.st_size, st.st_mtime_ns))
+        return files
+
+    def _changed(self, fp:str, size:int, mtime:int) -> bool:
+        """Internal Function. Checks if the file is different from when it was cached"""
+        index = self.objects.get(self.key(fp))
+        return index is None or index.get('size') != size or index.get('mtime') != mtime
+
+    def add_directory(self, *path:str, rewrite:bool=False, sync:bool=False, checksum:bool=False, workers:int=None, trackcommand=None) -> Self:
         """
-        Add all files in directory to cache
+        Add all files in directory to cache. Files are copied on a thread pool and the index is written once at the end. The speed is saved to `last_report`
 
         :param path: The directory to cache
         :type path: str
         :param rewrite:  When true it will re-cache this directory even if its already cached, defaults to False
         :type rewrite: bool, optional
+        :param sync: When true only new files and files with a different size or modified time are copied, and files that no longer exist are removed from the cache, defaults to False
+        :type sync: bool, optional
+        :param checksum: When true sync also compares the content of files that look unchanged, defaults to False
+        :type checksum: bool, optional
+        :param workers: The number of threads that copy files, defaults to None
+        :type workers: int, optional
+        :param trackcommand: The callback command for every file that has been cached, defaults to None
+        :type trackcommand: Function, optional
         :rtype: Cache
         """
         p = os.path.join(*path)
         if os.path.exists(p) and os.path.isdir(p):
-            for file in os.listdir(p):
-                fp = os.path.join(p, file)
-                if os.path.isfile(fp): self.add_file(fp, rewrite=rewrite)
-                else: self.add_directory(fp, rewrite=rewrite)
+            start = time.perf_counter()
+            scan = self._scan(p)
+            if sync: files = [(fp, mtime) for fp, size, mtime in scan if checksum or self._changed(fp, size, mtime)]
+            else: files = [(fp, mtime) for fp, size, mtime in scan if self.exists(fp)==False or rewrite]
+            total = len(files)
+            count = 0
+            size = 0
+            changed = False
+            try:
+                if sync: # Remove files that no longer exist
+                    found = set(self.key(fp) for fp, size, mtime in scan)
+                    for key in [key for key in self._subtree(p) or [] if key not in found]:
+                        self._del_entry(key)
+                        changed = True
+                order = [] # Files that can be evicted, only built once the cache is full
+                with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='Cache') as pool:
+                    futures = {pool.submit(self._store, fp): (fp, mtime) for fp, mtime in files}
+                    for future in concurrent.futures.as_completed(futures):
+                        fp, mtime = futures[future]
+                        obj = future.result()
+                        if obj['hash'] not in self.refs and os.path.exists(self._cache_path(obj['hash'], obj['codec'])) == False:
+                            obj = self._store(fp) # The worker found it cached, but it has been evicted since
+                        key = str(self.key(fp))
+                        old = self.objects.get(key)
+                        if old is None or old['hash'] != obj['hash'] or old.get('mtime') != mtime:
+                            self._set_entry(key, dict(obj, mtime=mtime))
+                            changed = True
+                            self._evict(key, order) # Stay in the limits while the files are added
+                        count += 1
+                        size += obj['size']
+                        if trackcommand != None: trackcommand(TrackEvent(fp, count, total))
+            finally:
+                if self._evict(): changed = True
+                if changed: self._write_index()
+                self.last_report = CacheReport(count, size, time.perf_counter() - start)
         else: raise CacheError(f"No such directory: '{os.path.join(*path)}'")
         return self
 
@@ -858,38 +2482,204 @@ class Cache():
         key = self.key(*path)
         index = self.objects.get(key)
         if index is not None:
-            cache_path = self._cache_path(index['hash'])
-            os.remove(cache_path)
-            del self.objects[key]
+            self._del_entry(key)
             self._write_index()
         else: raise CacheError(f"No such file: '{os.path.join(*path)}'")
         return self
     
-    def get_file(self, *path:str) -> str:
+    def _add_download(self, url:str, fp:str, etag:str=None, last_modified:str=None):
+        """Internal Function. Caches a downloaded file with the validators the server sent for it"""
+        self.add_file(fp, rewrite=True)
+        key = self.key(fp)
+        entry = self.objects.get(key)
+        if entry is None: return # Evicted straight away
+        entry.update(url=url, etag=etag, last_modified=last_modified)
+        self._changes[key] = entry
+        self._write_index()
+
+    def _restore(self, fp:str):
+        """Internal Function. Copies the cached object back to fp, unless fp has not changed since it was cached"""
+        key, index, obj = self._lookup(fp)
+        if os.path.exists(fp):
+            st = os.stat(fp)
+            if self._changed(fp, st.st_size, st.st_mtime_ns) == False: return
+        part = fp + '.part'
+        with open(part, 'wb') as wb: self._copy_out(index, obj, wb)
+        os.replace(part, fp)
+        index['mtime'] = os.stat(fp).st_mtime_ns
+        self._changes[key] = index
+        self._write_index()
+
+    def list_directory(self, *path:str) -> list[str]:
+        """
+        Returns every cached file in the directory and its sub directories
+
+        :param path: The directory
+        :type path: str
+        :return: The keys of the cached files
+        :rtype: list[str]
         """
-        Returns a temp file path
+        keys = self._subtree(*path)
+        if keys is None: raise CacheError(f"No such directory: '{os.path.join(*path)}'")
+        return keys
 
-        :param path: The file to get from cache.
+    def remove_directory(self, *path:str) -> Self:
+        """
+        Delete every file in the directory and its sub directories from cache
+
+        :param path: The directory to delete from cache
         :type path: str
-        :return: The name of the file
-        :rtype: str
+        :rtype: Cache
+        """
+        for key in self.list_directory(*path): self._del_entry(key)
+        self._write_index()
+        return self
+
+    def restore_directory(self, *path:str, dst:str, workers:int=None, trackcommand=None) -> Self:
+        """
+        Copies every cached file in the directory and its sub directories to dst on a thread pool. The speed is saved to `last_report`
+
+        :param path: The cached directory
+        :type path: str
+        :param dst: The directory to copy the files to
+        :type dst: str
+        :param workers: The number of threads that copy files, defaults to None
+        :type workers: int, optional
+        :param trackcommand: The callback command for every file that has been restored, defaults to None
+        :type trackcommand: Function, optional
+        :rtype: Cache
         """
+        start = time.perf_counter()
+        prefix = self.key(*path).rstrip('/') + '/'
+        files = []
+        for key in self.list_directory(*path):
+            key, index, fp = self._lookup(key)
+            files.append((os.path.join(dst, *key[len(prefix):].split('/')), index, fp))
+        for folder in set(os.path.dirname(target) for target, index, fp in files): os.makedirs(folder, exist_ok=True)
+        def restore(target:str, index:dict, fp:str):
+            with open(target, 'wb') as wb: self._copy_out(index, fp, wb)
+        count = 0
+        size = 0
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='Cache') as pool:
+                futures = {pool.submit(restore, *file): file for file in files}
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+                    target, index, fp = futures[future]
+                    count += 1
+                    size += index['size']
+                    if trackcommand != None: trackcommand(TrackEvent(target, count, len(files)))
+        finally:
+            self.last_report = CacheReport(count, size, time.perf_counter() - start)
+        return self
+
+    def _lookup(self, *path:str) -> tuple[str, dict, str]:
+        """Internal Function. Returns the key, index entry and object path of a cached file"""
         key = self.key(*path)
         index = self.objects.get(key)
         if index is not None:
-            fp = self._cache_path(index['hash'])
+            fp = self._cache_path(index['hash'], index.get('codec'))
             # Make sure filesize matches
-            if index.get('size') == os.path.getsize(fp):
-                suffix = os.path.splitext(key)[1]
-                tmp = tempfile.NamedTemporaryFile(suffix=suffix,delete=False)
-                global __temp__
-                __temp__.append(tmp)
-                with open(fp, 'rb') as rb: tmp.write(rb.read())
-                return tmp.name
+            if os.path.exists(fp) and index.get('stored', index.get('size')) == os.path.getsize(fp) and (self.verify == False or self._verify(index['hash'], index.get('codec'))):
+                index['atime'] = time.time()
+                index['hits'] = index.get('hits', 0) + 1
+                self._stats['hits'] += 1
+                self._changes[key] = index
+                self._dirty = True
+                return key, index, fp
             raise CacheError(f"File has been modified or is corrupt: '{fp}'")
+        self._stats['misses'] += 1
         raise CacheError(f"No such file: '{os.path.join(*path)}'")
 
+    def _extract(self, key:str, index:dict, fp:str) -> str:
+        """Internal Function. Copies the cached object to a new temp file, decompressing it if needed"""
+        suffix = os.path.splitext(key)[1]
+        tmp = tempfile.NamedTemporaryFile(suffix=suffix,delete=False)
+        global __temp__
+        __temp__.append(tmp)
+        self._copy_out(index, fp, tmp)
+        tmp.flush()
+        return tmp.name
+
+    def _decompressed(self, key:str, index:dict, fp:str) -> str:
+        """Internal Function. Returns the read-only temp file the compressed object was decompressed to, decompressing it only the first time"""
+        with self._extract_lock:
+            name = self._extracted.get(index['hash'])
+            if name is None or os.path.exists(name) == False:
+                name = self._extract(key, index, fp)
+                os.chmod(name, 0o444)
+                self._extracted[index['hash']] = name
+            return name
+
+    def _copy_out(self, index:dict, fp:str, wb:BinaryIO):
+        """Internal Function. Copies the cached object into the open file, decompressing it if needed"""
+        if index.get('codec') is None:
+            with open(fp, 'rb') as rb: _copy_file(rb, wb, self.CHUNK_SIZE)
+        else:
+            with self.CODECS[index['codec']][1](fp, 'rb', None) as rb: shutil.copyfileobj(rb, wb, self.CHUNK_SIZE)
+
+    def path(self, *path:str) -> str:
+        """
+        Returns the path of the cached object. The object is read-only and is shared by every cached file with the same content, it must not be changed. Compressed objects are decompressed once to a read-only temp file that is deleted when the script ends
+
+        :param path: The file to get from cache
+        :type path: str
+        :return: The path to the cached object
+        :rtype: str
+        """
+        key, index, fp = self._lookup(*path)
+        if index.get('codec') is None: return fp
+        return self._decompressed(key, index, fp)
+
+    def open(self, *path:str) -> BinaryIO:
+        """
+        Opens the cached file for reading. Compressed objects are decompressed while they are read
+
+        :param path: The file to get from cache
+        :type path: str
+        :return: The file opened in 'rb' mode
+        :rtype: BinaryIO
+        """
+        key, index, fp = self._lookup(*path)
+        if index.get('codec') is None: return open(fp, 'rb')
+        return self.CODECS[index['codec']][1](fp, 'rb', None)
+
+    def mmap(self, *path:str) -> memoryview:
+        """
+        Returns the content of the cached file without copying it into memory
+
+        :param path: The file to get from cache
+        :type path: str
+        :return: A read-only memoryview over the memory-mapped file
+        :rtype: memoryview
+        """
+        fp = self.path(*path)
+        with open(fp, 'rb') as r:
+            if os.fstat(r.fileno()).st_size == 0: return memoryview(b'') # Empty files can not be mapped
+            return memoryview(mmap.mmap(r.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def get_file(self, *path:str, temp:bool=False) -> str:
+        """
+        Returns the path of the cached file. This is the read-only cached object (or its decompressed copy, see `path`) unless temp is true
+
+        :param path: The file to get from cache.
+        :type path: str
+        :param temp: When true the file is copied to a new temp file that can be changed, which is deleted when the script ends, defaults to False
+        :type temp: bool, optional
+        :return: The name of the file
+        :rtype: str
+        """
+        key, index, fp = self._lookup(*path)
+        if temp: return self._extract(key, index, fp)
+        if index.get('codec') is None: return fp
+        return self._decompressed(key, index, fp)
+
 def _cleanup():
+    # Write unsaved storage changes. A store that fails to save must not stop the rest of the cleanup
+    for store in [*__root__['storage'], *__root__['cache']]:
+        try: store.flush()
+        except Exception as err: print(f'Could not save {store}: {err}', file=sys.stderr)
+
     # destroy sessionStorage
     stores = get_session_storage(False)
     if stores is not None:
@@ -899,7 +2689,10 @@ def _cleanup():
     global __temp__
     for tmp in __temp__:
         tmp.close()
-        os.unlink(tmp.name)
+        try:
+            os.chmod(tmp.name, 0o644) # Windows can not delete read-only files
+            os.unlink(tmp.name)
+        except FileNotFoundError: pass
 
 atexit.register(_cleanup)
 
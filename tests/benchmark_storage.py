@@ -0,0 +1,32 @@
+import UserFolder
+import time
+import yaml
+
+user = UserFolder.User('_test')
+
+KEYS = 5000
+ROUNDS = 3
+data = {'key%s' % i: {'name': 'value %s' % i, 'count': i, 'enabled': i % 2 == 0, 'tags': ['a', 'b']} for i in range(KEYS)}
+
+def bench(name, loads, dumps):
+    start = time.perf_counter()
+    for i in range(ROUNDS): raw = dumps(data)
+    dump = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(ROUNDS): loads(raw)
+    load = time.perf_counter() - start
+    mb = len(raw) * ROUNDS / 1024 / 1024
+    print('{0:<16} {1:>8.1f} KiB  parse {2:>8.1f} MiB/s  dump {3:>8.1f} MiB/s'.format(name, len(raw) / 1024, mb / load, mb / dump))
+
+# Old pure-Python loader
+bench('yaml (python)', lambda raw: yaml.load(raw, yaml.FullLoader), lambda d: yaml.dump(d).encode('utf-8'))
+for name in ['yaml', 'json', 'pickle']:
+    serializer = UserFolder.get_serializer(name)
+    bench(name, serializer.loads, serializer.dumps)
+
+# Convert a storage to another format
+storage = UserFolder.Storage(user, 'benchmark.yaml')
+storage.update(data)
+storage.migrate('json')
+print(UserFolder.Storage(user, 'benchmark.yaml').serializer)
+storage.destroy()
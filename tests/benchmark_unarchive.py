@@ -0,0 +1,37 @@
+import UserFolder
+import os
+import shutil
+import tarfile
+import time
+import zipfile
+
+user = UserFolder.User('_test')
+
+MEMBERS = 1000
+SIZE = 32 * 1024
+data = [os.urandom(SIZE // 2) + b'UserFolder ' * (SIZE // 22) for i in range(MEMBERS)]
+total = sum(len(d) for d in data)
+
+def bench(name, archive, **kw):
+    shutil.rmtree(user.join('unarchived'), ignore_errors=True)
+    start = time.perf_counter()
+    user.unarchive(archive, 'unarchived', deletesrc=False, **kw)
+    seconds = time.perf_counter() - start
+    print('{0:<16} {1:>10.1f} members/s  {2:>8.1f} MiB/s'.format(name, MEMBERS / seconds, total / seconds / 1024 / 1024))
+
+# Zip, one thread and a thread pool
+with zipfile.ZipFile(user.join('benchmark.zip'), 'w', zipfile.ZIP_DEFLATED) as z:
+    for i, d in enumerate(data): z.writestr('dir%s/member%s.bin' % (i % 20, i), d)
+bench('zip', 'benchmark.zip')
+for workers in [2, 4, 8]: bench('zip (%s workers)' % workers, 'benchmark.zip', workers=workers)
+assert user.open('unarchived/dir7/member7.bin', 'rb').read() == data[7]
+
+# Tar formats
+shutil.rmtree(user.join('unarchived'), ignore_errors=True)
+user.unarchive('benchmark.zip', 'unarchived', deletesrc=False, workers=None)
+for ext, mode in [('.tar', 'w'), ('.tar.gz', 'w:gz'), ('.tar.xz', 'w:xz'), ('.tar.bz2', 'w:bz2')]:
+    with tarfile.open(user.join('benchmark' + ext), mode) as t: t.add(user.join('unarchived'), '.')
+for ext in ['.tar', '.tar.gz', '.tar.xz', '.tar.bz2']: bench(ext, 'benchmark' + ext)
+
+for ext in ['.zip', '.tar', '.tar.gz', '.tar.xz', '.tar.bz2']: user.remove('benchmark' + ext)
+user.remove('unarchived', True)
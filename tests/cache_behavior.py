@@ -0,0 +1,151 @@
+import UserFolder
+import os
+import shutil
+import tempfile
+import time
+
+# Behavior checks for Cache. Every check uses its own cache id and cleans up the files it made
+
+def write(src, name, data):
+    fp = os.path.join(src, *name.split('/'))
+    os.makedirs(os.path.dirname(fp), exist_ok=True)
+    with open(fp, 'wb') as w: w.write(data)
+    return fp
+
+def objects(cache):
+    folder = cache.user.join('.cache', 'objects', str(cache.id))
+    return sum(len(files) for path, dirs, files in os.walk(folder))
+
+def clean(cache):
+    for key in list(cache.objects): cache._del_entry(key)
+    cache.compact()
+    os.remove(cache.index_path)
+
+def check_dedup(user, src):
+    # Files with the same content share one object, which is deleted with its last file
+    cache = UserFolder.Cache('behavior-dedup', user)
+    a = write(src, 'dedup/a.txt', b'same content')
+    b = write(src, 'dedup/b.txt', b'same content')
+    cache.add_file(a).add_file(b)
+    assert objects(cache) == 1 and cache.refs[cache.objects[cache.key(a)]['hash']] == 2
+    cache.remove_file(a)
+    assert objects(cache) == 1 and open(cache.get_file(b), 'rb').read() == b'same content'
+    cache.remove_file(b)
+    assert objects(cache) == 0
+    clean(cache)
+
+def check_sync(user, src):
+    # Syncing again only copies what changed and removes files that are gone
+    cache = UserFolder.Cache('behavior-sync', user)
+    files = [write(src, 'sync/%s.txt' % i, b'file %d' % i) for i in range(4)]
+    cache.add_directory(src, 'sync', sync=True)
+    assert cache.last_report.files == 4
+    cache.add_directory(src, 'sync', sync=True)
+    assert cache.last_report.files == 0
+    os.remove(files[0])
+    write(src, 'sync/1.txt', b'changed')
+    cache.add_directory(src, 'sync', sync=True)
+    assert cache.last_report.files == 1 and cache.exists(files[0]) == False
+    assert open(cache.get_file(files[1]), 'rb').read() == b'changed'
+    clean(cache)
+
+def check_eviction(user, src):
+    # Eviction keeps the cache in its limits and removes the least recently / frequently used file
+    for policy in ['lru', 'lfu']:
+        cache = UserFolder.Cache('behavior-' + policy, user, max_entries=3, policy=policy)
+        files = [write(src, '%s/%s.txt' % (policy, i), b'file %d' % i) for i in range(3)]
+        for fp in files: cache.add_file(fp)
+        time.sleep(0.01)
+        cache.path(files[0]) # Used last and most often
+        cache.path(files[0])
+        cache.path(files[2])
+        cache.add_file(write(src, '%s/3.txt' % policy, b'file 3'))
+        assert len(cache.objects) == 3 and cache.exists(files[1]) == False and cache.exists(files[0])
+        assert cache.stats()['evictions'] == 1
+        clean(cache)
+    # Objects that a worker found already cached are not lost when they are evicted before the worker's result is added
+    for run in range(10):
+        cache = UserFolder.Cache('behavior-evict', user, max_entries=3)
+        for i in range(3): cache.add_file(write(src, 'evict/old/%s.txt' % i, b'old %d' % i))
+        new = [write(src, 'evict/new/%s%s.txt' % (name, i), b'%s %d' % (content, i)) for i in range(3) for name, content in [('new', b'new'), ('copy', b'old')]]
+        cache.add_directory(src, 'evict', 'new', workers=8)
+        assert len(cache.objects) == 3 and objects(cache) == len(cache.refs)
+        for fp in new:
+            if cache.exists(fp): cache.path(fp)
+        clean(cache)
+        shutil.rmtree(os.path.join(src, 'evict'))
+
+def check_index(user, src):
+    # Changes are in the journal straight away and read back without a flush or compact
+    cache = UserFolder.Cache('behavior-index', user)
+    a = write(src, 'index/a.txt', b'a')
+    cache.add_file(a)
+    assert os.path.exists(cache.journal_path) and UserFolder.Cache('behavior-index', user).exists(a)
+    # A line that was only partly written before a crash is cut off before the next change is appended
+    with open(cache.journal_path, 'a') as w: w.write('{"k": "/torn", "v": {"ha')
+    b = write(src, 'index/b.txt', b'b')
+    UserFolder.Cache('behavior-index', user).add_file(b)
+    reopened = UserFolder.Cache('behavior-index', user)
+    assert reopened.exists(a) and reopened.exists(b) and len(reopened.objects) == 2
+    # A damaged line is skipped
+    with open(cache.journal_path, 'a') as w: w.write('{"k": \n')
+    assert len(UserFolder.Cache('behavior-index', user).objects) == 2
+    reopened.compact()
+    assert os.path.exists(cache.journal_path) == False and UserFolder.Cache('behavior-index', user).objects == reopened.objects
+    clean(reopened)
+
+def check_compression(user, src):
+    # Compressed files come back the same and take less space
+    data = b'{"key": "value"}\n' * 20000
+    fp = write(src, 'compressed/data.json', data)
+    noise = write(src, 'compressed/noise.bin', os.urandom(100000))
+    for codec in ['gzip', 'bz2', 'lzma']:
+        cache = UserFolder.Cache('behavior-' + codec, user, compression=codec)
+        cache.add_file(fp).add_file(noise)
+        entry = cache.objects[cache.key(fp)]
+        assert entry['codec'] == codec and entry['stored'] < entry['size']
+        assert cache.objects[cache.key(noise)]['codec'] is None # Does not compress, stored as it is
+        assert cache.open(fp).read() == data and bytes(cache.mmap(fp)) == data
+        assert cache.path(fp) == cache.get_file(fp) # Decompressed once
+        clean(cache)
+
+def check_scrub(user, src):
+    # Scrub finds corrupt objects and quarantines them
+    cache = UserFolder.Cache('behavior-scrub', user)
+    good = write(src, 'scrub/good.txt', b'good')
+    bad = write(src, 'scrub/bad.txt', b'will be corrupted')
+    cache.add_file(good).add_file(bad)
+    obj = cache.path(bad)
+    os.chmod(obj, 0o644)
+    with open(obj, 'r+b') as w: w.write(b'W')
+    assert cache.scrub(workers=2) == [cache.key(bad)]
+    assert cache.scrub(quarantine=True) == [cache.key(bad)]
+    assert cache.exists(bad) == False and cache.exists(good) and cache.scrub() == []
+    shutil.rmtree(cache.quarantine_path)
+    clean(cache)
+
+def check_tree(user, src):
+    # Directory operations only look at the files in that directory
+    cache = UserFolder.Cache('behavior-tree', user)
+    for d in ['x', 'y', 'x/z']:
+        for f in ['a', 'b']: write(src, 'tree/%s/%s.txt' % (d, f), b'%s %s' % (d.encode(), f.encode()))
+    cache.add_directory(src, 'tree', workers=4)
+    assert len(cache.list_directory(src, 'tree')) == 6 and len(cache.list_directory(src, 'tree', 'x')) == 4
+    dst = tempfile.mkdtemp()
+    cache.restore_directory(src, 'tree', 'x', dst=dst)
+    assert open(os.path.join(dst, 'z', 'a.txt'), 'rb').read() == b'x/z a'
+    shutil.rmtree(dst)
+    cache.remove_directory(src, 'tree', 'x')
+    assert len(cache.objects) == 2 and cache.list_directory(src, 'tree') == cache.list_directory(src, 'tree', 'y')
+    # The tree is built again when the index is read
+    assert UserFolder.Cache('behavior-tree', user).list_directory(src, 'tree') == cache.list_directory(src, 'tree')
+    clean(cache)
+
+if __name__ == '__main__':
+    user = UserFolder.User('_test')
+    src = tempfile.mkdtemp()
+    for name, check in list(globals().items()):
+        if name.startswith('check_'):
+            check(user, src)
+            print('ok', name)
+    shutil.rmtree(src)
@@ -0,0 +1,123 @@
+import UserFolder
+import http.server
+import threading
+import os
+import re
+import hashlib
+import time
+import concurrent.futures
+
+# A local stand-in for a download server that supports Range requests
+DATA = os.urandom(5 * 1024 * 1024 + 123)
+ETAG = '"%s"' % hashlib.sha1(DATA).hexdigest()
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep connections open
+    interrupt = True # Drop the first request for /flaky half way through
+
+    def do_GET(self):
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.send_header('ETag', ETAG)
+            self.end_headers()
+            return
+        start, end = 0, len(DATA) - 1
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if self.headers.get('If-Range', ETAG) != ETAG: match = None # The file has changed, send all of it
+        if match:
+            start = int(match.group(1))
+            if match.group(2): end = min(int(match.group(2)), end)
+        if start >= len(DATA):
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{len(DATA)}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(206 if match else 200)
+        if match: self.send_header('Content-Range', f'bytes {start}-{end}/{len(DATA)}')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', ETAG)
+        self.send_header('Content-Length', str(end + 1 - start))
+        self.end_headers()
+        body = DATA[start:end + 1]
+        if self.path == '/flaky' and Handler.interrupt:
+            Handler.interrupt = False
+            body = body[:len(body) // 2]
+            self.close_connection = True
+        if self.path.startswith('/slow'): # Sent slowly so it can be cancelled half way through
+            try:
+                for i in range(0, len(body), 64 * 1024):
+                    self.wfile.write(body[i:i + 64 * 1024])
+                    time.sleep(0.05)
+            except (BrokenPipeError, ConnectionResetError): pass
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args): pass
+
+server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+URL = f'http://127.0.0.1:{server.server_port}'
+
+user = UserFolder.User('_test')
+
+def progress(e: UserFolder.TrackEvent):
+    print('Progress: {0} of {1} bytes ({2:.0f}%)'.format(e.count, e.total, e.percentage), end='\r')
+
+# Streamed download
+user.download(URL + '/package.bin', 'package.bin', trackcommand=progress)
+print()
+assert user.open('package.bin', 'rb').read() == DATA
+
+# Interrupted download, resumed from the .part file
+try: user.download(URL + '/flaky', 'flaky.bin')
+except Exception as e: print('Interrupted:', type(e).__name__)
+print('Partial:', os.path.getsize(user.join('flaky.bin.part')), 'bytes')
+user.download(URL + '/flaky', 'flaky.bin', trackcommand=progress)
+print()
+assert user.open('flaky.bin', 'rb').read() == DATA
+assert user.exists('flaky.bin.part') == False
+
+# A .part file of another version of the file is not resumed
+open(user.join('stale.bin.part'), 'wb').write(b'old' * 1000)
+open(user.join('stale.bin.part.json'), 'w').write('{"url": "%s/stale", "validator": "\\"old\\""}' % URL)
+user.download(URL + '/stale', 'stale.bin')
+assert user.open('stale.bin', 'rb').read() == DATA
+assert user.exists('stale.bin.part.json') == False
+
+# Segmented download, checked against its sha256
+user.download(URL + '/package.bin', 'segments.bin', segments=4, checksum=hashlib.sha256(DATA).hexdigest())
+assert user.open('segments.bin', 'rb').read() == DATA
+try: user.download(URL + '/package.bin', 'segments.bin', segments=4, checksum='0' * 64)
+except UserFolder.DownloadError as e: print(e)
+
+# Cached download, only downloaded again when it has changed on the server
+cache = UserFolder.Cache('downloads', user)
+user.download(URL + '/package.bin', 'cached.bin', cache=cache)
+mtime = os.stat(user.join('cached.bin')).st_mtime_ns
+print('Not modified:', user.download(URL + '/package.bin', 'cached.bin', cache=cache).status_code)
+assert os.stat(user.join('cached.bin')).st_mtime_ns == mtime
+user.remove('cached.bin')
+user.download(URL + '/package.bin', 'cached.bin', cache=cache) # Restored from the cache
+assert user.open('cached.bin', 'rb').read() == DATA
+cache.remove_file(user.join('cached.bin'))
+
+# Many downloads on a thread pool that share one session
+downloads = user.download_many({URL + '/asset%s' % i: 'assets/asset%s.bin' % i for i in range(50)}, max_workers=8)
+print(downloads.wait())
+assert all(r.status_code == 200 for r in downloads.results())
+
+# Cancelled downloads stop after their current chunk and keep their .part file
+downloads = user.download_many({URL + '/slow%s' % i: 'slow/slow%s.bin' % i for i in range(10)}, max_workers=2)
+time.sleep(0.5)
+downloads.cancel()
+results = downloads.results()
+assert downloads.done and downloads.report.files == 0
+assert sum(isinstance(r, concurrent.futures.CancelledError) for r in results) == 8
+assert all(user.exists('slow/slow%s.bin.part' % i) for i, r in enumerate(results) if isinstance(r, UserFolder.DownloadError))
+print('Cancelled:', downloads.report)
+
+for name in ['package.bin', 'flaky.bin', 'segments.bin', 'cached.bin', 'stale.bin']: user.remove(name)
+user.remove('assets', True)
+user.remove('slow', True)
+server.shutdown()
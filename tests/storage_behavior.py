@@ -0,0 +1,196 @@
+import UserFolder
+import asyncio
+import multiprocessing
+import os
+
+# Behavior checks for Storage and SQLiteStorage. Every check cleans up the files it made
+
+def writer(filename, journal, worker, count):
+    store = UserFolder.Storage(UserFolder.User('_test'), filename, journal=journal, compact_ratio=0.1)
+    for i in range(count): store.set_item('%s-%s' % (worker, i), i)
+
+def check_cache(user):
+    # Changing a returned value does not change the stored value
+    store = UserFolder.Storage(user, 'cache.yaml')
+    store.set_item('a', [1])
+    store.get_item('a').append(2)
+    assert store.get_item('a') == [1] and UserFolder.Storage(user, 'cache.yaml').get_item('a') == [1]
+    # The file is read again when another instance has changed it
+    UserFolder.Storage(user, 'cache.yaml').set_item('a', [3])
+    assert store.get_item('a') == [3]
+    store.destroy()
+
+def check_journal(user):
+    # A record that was only partly written is not replayed
+    store = UserFolder.Storage(user, 'journal.yaml', journal=True)
+    store.update({'a': 1, 'b': 2})
+    with open(store.journal_file, 'a') as a: a.write('--- \n- set\n- c\n')
+    assert dict(UserFolder.Storage(user, 'journal.yaml', journal=True).items()) == {'a': 1, 'b': 2}
+    # The journal is also read when the store is opened without journal=True
+    assert UserFolder.Storage(user, 'journal.yaml').get_item('b') == 2
+    # The next record is not appended to the part that was written before a crash
+    store.set_item('c', 3)
+    with open(store.journal_file, 'a') as a: a.write('--- \n- set\n- secret\n- half-writ')
+    UserFolder.Storage(user, 'journal.yaml', journal=True).set_item('d', 4)
+    assert dict(UserFolder.Storage(user, 'journal.yaml').items()) == {'a': 1, 'b': 2, 'c': 3, 'd': 4}
+    # Records that are not changes are ignored
+    with open(store.journal_file, 'a') as a: a.write('--- \n- set\n...\n--- [\n...\n')
+    assert len(UserFolder.Storage(user, 'journal.yaml')) == 4
+    store.destroy()
+
+def check_batch(user):
+    # A batch is written once, or not at all when it raises
+    store = UserFolder.Storage(user, 'batch.yaml')
+    store.set_item('a', 1)
+    with store.batch():
+        store.update({'b': 2, 'c': 3})
+        store.remove_many(['a'])
+        assert UserFolder.Storage(user, 'batch.yaml').get_item('a') == 1 # Not written yet
+    assert dict(UserFolder.Storage(user, 'batch.yaml').items()) == {'b': 2, 'c': 3}
+    try:
+        with store.batch():
+            store.set_item('b', 20)
+            store.remove_item('missing')
+    except KeyError: pass
+    assert dict(store.items()) == {'b': 2, 'c': 3}
+    assert dict(UserFolder.Storage(user, 'batch.yaml').items()) == {'b': 2, 'c': 3}
+    store.destroy()
+
+def check_keys(user):
+    # key() and len() follow every change
+    store = UserFolder.Storage(user, 'keys.json', serializer='json')
+    store.update({'x': 1, 'y': 2, 'z': 3})
+    assert [store.key(i) for i in range(3)] == ['x', 'y', 'z'] and len(store) == 3
+    store.remove_item('y')
+    store.set_item('w', 4)
+    store.set_item('x', 5) # Keeps its place
+    assert list(store) == ['x', 'z', 'w'] and store.key(2) == 'w' and len(store) == 3
+    # A value the format can not store leaves no key behind
+    try: store.set_item('bad', object())
+    except TypeError: pass
+    assert list(store) == ['x', 'z', 'w'] and len(store) == 3
+    assert list(UserFolder.Storage(user, 'keys.json')) == ['x', 'z', 'w']
+    store.destroy()
+
+def check_serializers(user):
+    for serializer in ['yaml', 'json', 'pickle']:
+        store = UserFolder.Storage(user, 'serializer.' + serializer, serializer=serializer)
+        store.update({'a': 1, 'b': [1, 2], 'c': {'d': 'e'}})
+        if serializer != 'pickle': assert UserFolder.Storage(user, 'serializer.' + serializer).serializer == serializer
+        assert dict(UserFolder.Storage(user, 'serializer.' + serializer, serializer=serializer).items()) == {'a': 1, 'b': [1, 2], 'c': {'d': 'e'}}
+        store.destroy()
+    # A value that could not be read back is rejected, also when it would only be written to the journal
+    for serializer, journal in [('yaml', False), ('pickle', True)]:
+        store = UserFolder.Storage(user, 'serializer.bin', serializer=serializer, journal=journal)
+        try: store.set_item('fs', frozenset({1, 2}))
+        except TypeError: pass
+        assert len(store) == 0 and len(UserFolder.Storage(user, 'serializer.bin', serializer=serializer)) == 0
+        store.destroy()
+    # Pickle is never loaded unless it is asked for, it can run code
+    store = UserFolder.Storage(user, 'trusted.pkl', serializer='pickle')
+    store.set_item('a', 1)
+    try: UserFolder.Storage(user, 'trusted.pkl')
+    except ValueError as e: assert 'pickle' in str(e)
+    else: raise AssertionError('pickle was loaded')
+    with open(user.join('trusted.yaml'), 'wb') as w: w.write(open(store.file, 'rb').read())
+    try: UserFolder.Storage(user, 'trusted.yaml')
+    except ValueError as e: assert 'pickle' in str(e)
+    else: raise AssertionError('pickle was loaded')
+    UserFolder.Storage(user, 'trusted.yaml', serializer='pickle').migrate('yaml')
+    assert UserFolder.Storage(user, 'trusted.yaml').get_item('a') == 1
+    UserFolder.Storage(user, 'trusted.yaml').destroy()
+    store.destroy()
+    assert UserFolder.Storage(user, 'new.pkl').serializer == 'yaml'
+    os.remove(user.join('new.pkl'))
+    # '{}' is YAML
+    with open(user.join('flow.yaml'), 'w') as w: w.write('{}')
+    assert UserFolder.Storage(user, 'flow.yaml').serializer == 'yaml'
+    os.remove(user.join('flow.yaml'))
+
+def check_sqlite(user):
+    store = UserFolder.SQLiteStorage(user, 'behavior.db')
+    store.set_item('a', 1)
+    try:
+        with store.batch():
+            store.set_item('a', 2)
+            with store.batch():
+                store.set_item('b', 3)
+            raise RuntimeError
+    except RuntimeError: pass
+    assert dict(store.items()) == {'a': 1}
+    store.update({'c': [1, 2], 'd': 4})
+    assert list(store) == ['a', 'c', 'd'] and store.key(1) == 'c' and len(store) == 3
+    store.migrate('json')
+    assert UserFolder.SQLiteStorage(user, 'behavior.db').get_item('c') == [1, 2]
+    store.destroy()
+
+def check_processes(user):
+    # No change is lost when 4 processes write to the same file
+    for journal in [False, True]:
+        filename = 'processes-%s.yaml' % journal
+        processes = [multiprocessing.Process(target=writer, args=(filename, journal, worker, 50)) for worker in range(4)]
+        for p in processes: p.start()
+        for p in processes: p.join()
+        store = UserFolder.Storage(user, filename, journal=journal)
+        assert len(store) == 200, len(store)
+        store.destroy()
+
+def check_blobs(user):
+    # Large values are stored in their own file and come back as a memory-mapped memoryview
+    store = UserFolder.Storage(user, 'blobs.yaml', blob_threshold=16)
+    store.set_item('small', b'x')
+    store.set_item('large', b'y' * 100)
+    large = UserFolder.Storage(user, 'blobs.yaml', blob_threshold=16).get_item('large')
+    assert isinstance(large, memoryview) and large.readonly and bytes(large) == b'y' * 100
+    assert store.get_item('small') == b'x' and len(os.listdir(store.blob_path)) == 1
+    # Blobs written inside a batch that is rolled back are deleted, and replaced blobs once the change is written
+    try:
+        with store.batch():
+            store.set_item('rolled back', b'z' * 100)
+            store.remove_item('missing')
+    except KeyError: pass
+    store.set_item('large', b'w' * 100)
+    assert list(store) == ['small', 'large'] and len(os.listdir(store.blob_path)) == 1
+    store.destroy()
+
+def check_async(user):
+    store = UserFolder.Storage(user, 'async.yaml')
+    writes = [0]
+    dump = store._dump
+    def counted():
+        writes[0] += 1
+        dump()
+    store._dump = counted
+    async def main(): await asyncio.gather(*(store.aset_item('key%s' % i, i) for i in range(200)))
+    asyncio.run(main())
+    assert len(UserFolder.Storage(user, 'async.yaml')) == 200
+    assert writes[0] < 200, writes[0] # Written together instead of once per change
+    async def read(): return await store.aget_item('key7')
+    assert asyncio.run(read()) == 7
+    store.destroy()
+
+def check_mapping(user):
+    store = UserFolder.Storage(user, 'mapping.yaml')
+    store['a'] = 1
+    store.update({'b': 2}, c=3)
+    assert 'a' in store and 'x' not in store and store['b'] == 2 and len(store) == 3
+    del store['b']
+    assert store.pop('c') == 3 and store.setdefault('d', 4) == 4
+    assert list(store.keys()) == ['a', 'd'] and list(store.values()) == [1, 4] and dict(store.items()) == {'a': 1, 'd': 4}
+    # .get returns None or the default like dict.get, .get_item raises a KeyError
+    assert store.get('missing') is None and store.get('missing', 0) == 0 and store.get('a') == 1
+    try: store.get_item('missing')
+    except KeyError: pass
+    else: raise AssertionError('no KeyError')
+    try: store['missing']
+    except KeyError: pass
+    else: raise AssertionError('no KeyError')
+    assert dict(UserFolder.Storage(user, 'mapping.yaml')) == {'a': 1, 'd': 4}
+    store.destroy()
+
+if __name__ == '__main__':
+    user = UserFolder.User('_test')
+    for name, check in list(globals().items()):
+        if name.startswith('check_'):
+            check(user)
+            print('ok', name)
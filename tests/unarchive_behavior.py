@@ -0,0 +1,49 @@
+import UserFolder
+import os
+import tarfile
+import zipfile
+
+# Behavior checks for User.unarchive. Every check cleans up the files it made
+
+user = UserFolder.User('_test')
+data = {'dir%s/sub/member%s.txt' % (i % 5, i): b'member %d ' % i * 100 for i in range(50)}
+
+def read(folder):
+    found = {}
+    for path, dirs, files in os.walk(user.join(folder)):
+        for name in files:
+            fp = os.path.join(path, name)
+            found[os.path.relpath(fp, user.join(folder)).replace(os.sep, '/')] = open(fp, 'rb').read()
+    return found
+
+with zipfile.ZipFile(user.join('behavior.zip'), 'w', zipfile.ZIP_DEFLATED) as z:
+    z.writestr('empty/', b'') # A directory without members
+    for name, content in data.items(): z.writestr(name, content)
+
+# Every member is extracted on the thread pool, and trackcommand is called once for each of them
+for workers in [1, 4, None]:
+    events = []
+    assert user.unarchive('behavior.zip', 'unarchived', deletesrc=False, workers=workers, trackcommand=events.append)
+    assert read('unarchived') == data and os.path.isdir(user.join('unarchived', 'empty'))
+    assert sorted(e.count for e in events) == list(range(1, 52)) and all(e.total == 51 for e in events)
+    user.remove('unarchived', True)
+
+# Only the given members are extracted, by name or ZipInfo
+names = ['dir1/sub/member1.txt', 'dir2/sub/member7.txt']
+with zipfile.ZipFile(user.join('behavior.zip')) as z: infos = [z.getinfo(names[0]), names[1]]
+for members in [names, infos]:
+    user.unarchive('behavior.zip', 'unarchived', members=members, deletesrc=False, workers=4)
+    assert read('unarchived') == {name: data[name] for name in names}
+    user.remove('unarchived', True)
+
+# Tar formats, and the archive is deleted afterwards by default
+for ext, mode in [('.tar', 'w'), ('.tgz', 'w:gz'), ('.tar.xz', 'w:xz'), ('.tar.bz2', 'w:bz2')]:
+    user.unarchive('behavior.zip', 'source', deletesrc=False)
+    with tarfile.open(user.join('behavior' + ext), mode) as t: t.add(user.join('source'), '.')
+    user.remove('source', True)
+    assert user.unarchive('behavior' + ext, 'unarchived')
+    assert read('unarchived') == data and user.exists('behavior' + ext) == False
+    user.remove('unarchived', True)
+
+user.remove('behavior.zip')
+print('ok')